@@ -1,12 +1,21 @@
+import functools
+import json
 import logging
+import logging.handlers
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from urllib.parse import urljoin
 
 import requests
-from flask import jsonify
-from flask_babel import gettext
+from flask import Response
+from flask_babel import lazy_gettext
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 import octoprint.plugin
+from octoprint.events import Events
 from octoprint.logging.handlers import TriggeredRolloverLogHandler
 from octoprint.util.url import set_url_query_param
 
@@ -23,6 +32,21 @@ FLUIDD_LEGACY_CAMERA_TYPES = {
 }
 MJPEG_STREAMER_WEBCAM_SERVICES = ("mjpegstreamer", "mjpegstreamer-adaptive")
 
+HTTP_TIMEOUT = (5.0, 10.0)  # connect, read
+# only urllib3's default idempotent methods get retried
+HTTP_RETRIES = Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504))
+
+WEBCAM_CACHE_TTL = 30.0
+
+JSONRPC_CONSOLE_LOGGER = "octoprint.plugins.moonraker_connector.jsonrpc.console"
+
+CONNECTION_OPTIONS_NAME = lazy_gettext("Moonraker Connection")
+
+
+@functools.lru_cache(maxsize=64)
+def _mjpegstreamer_url(url: str, action: str) -> str:
+    return set_url_query_param(url, "action", action)
+
 
 class MoonrakerJsonRpcLogHandler(TriggeredRolloverLogHandler):
     pass
@@ -30,10 +54,12 @@ class MoonrakerJsonRpcLogHandler(TriggeredRolloverLogHandler):
 
 class MoonrakerConnectorPlugin(
     octoprint.plugin.AssetPlugin,
+    octoprint.plugin.EventHandlerPlugin,
     octoprint.plugin.TemplatePlugin,
     octoprint.plugin.SettingsPlugin,
     octoprint.plugin.SimpleApiPlugin,
     octoprint.plugin.StartupPlugin,
+    octoprint.plugin.ShutdownPlugin,
 ):
     def initialize(self):
         # this not only imports but also registers the connector with the system!
@@ -45,11 +71,41 @@ class MoonrakerConnectorPlugin(
         ConnectedMoonrakerPrinter._plugin_manager = self._plugin_manager
         ConnectedMoonrakerPrinter._plugin_settings = self._settings
 
+        self._jsonrpc_logging_listener = None
         self._jsonrpc_logging_handler = None
 
+        # shared session so repeated requests against Moonraker can reuse connections
+        self._session = requests.Session()
+        self._session.mount(
+            "http://",
+            HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=HTTP_RETRIES),
+        )
+
+        self._webcam_executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="Moonraker Webcam Worker "
+        )
+
+        # ((host, port, apikey), expiry, webcams)
+        self._webcam_cache = None
+
     def on_startup(self, host, port):
         self._configure_json_rpc_logging()
 
+    def on_shutdown(self):
+        if self._jsonrpc_logging_listener is not None:
+            self._jsonrpc_logging_listener.stop()
+            self._jsonrpc_logging_listener = None
+
+        if self._jsonrpc_logging_handler is not None:
+            # nothing consumes the queue anymore, so stop feeding it
+            logging.getLogger(JSONRPC_CONSOLE_LOGGER).removeHandler(
+                self._jsonrpc_logging_handler
+            )
+            self._jsonrpc_logging_handler = None
+
+        self._webcam_executor.shutdown(wait=False)
+        self._session.close()
+
     def _configure_json_rpc_logging(self):
         handler = MoonrakerJsonRpcLogHandler(
             self._settings.get_plugin_logfile_path(postfix="jsonrpc"),
@@ -60,13 +116,27 @@ class MoonrakerConnectorPlugin(
         handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
         handler.setLevel(logging.DEBUG)
 
-        logger = logging.getLogger(
-            "octoprint.plugins.moonraker_connector.jsonrpc.console"
+        # the actual file writes happen on the listener's thread, so that the
+        # connection threads don't have to wait for disk I/O or rollovers
+        log_queue = queue.SimpleQueue()
+        self._jsonrpc_logging_listener = logging.handlers.QueueListener(
+            log_queue, handler, respect_handler_level=True
         )
-        logger.addHandler(handler)
+        self._jsonrpc_logging_listener.start()
+
+        self._jsonrpc_logging_handler = logging.handlers.QueueHandler(log_queue)
+
+        logger = logging.getLogger(JSONRPC_CONSOLE_LOGGER)
+        logger.addHandler(self._jsonrpc_logging_handler)
         logger.setLevel(logging.DEBUG)
         logger.propagate = False
 
+    ##~~ EventHandlerPlugin mixin
+
+    def on_event(self, event, payload):
+        if event in (Events.CONNECTED, Events.DISCONNECTED):
+            self._webcam_cache = None
+
     ##~~ SettingsPlugin mixin
 
     def get_settings_defaults(self):
@@ -88,10 +158,11 @@ class MoonrakerConnectorPlugin(
             if host is not None and port is not None:
                 webcams = self._get_all_webcams(host, port, apikey=apikey)
 
-        response = schema.ApiResponse(
-            webcams=[self._to_api_webcam(webcam) for webcam in webcams]
+        # entries have already been validated while fetching
+        response = schema.ApiResponse.model_construct(webcams=webcams)
+        return Response(
+            response.model_dump_json(by_alias=True), mimetype="application/json"
         )
-        return jsonify(response.model_dump(by_alias=True))
 
     def is_api_protected(self):
         return True
@@ -102,7 +173,7 @@ class MoonrakerConnectorPlugin(
         return [
             {
                 "type": "connection_options",
-                "name": gettext("Moonraker Connection"),
+                "name": CONNECTION_OPTIONS_NAME,
                 "connector": "moonraker",
                 "template": "moonraker_connector_connection_option.jinja2",
                 "custom_bindings": True,
@@ -125,53 +196,94 @@ class MoonrakerConnectorPlugin(
         apikey = connection_state.get("apikey")
         return {"host": host, "port": port, "apikey": apikey}
 
+    def _query_moonraker(
+        self, method: str, url: str, host: str, port: int, headers: dict = None
+    ) -> dict:
+        r = self._session.request(
+            method,
+            url.format(host=host, port=port),
+            headers=headers,
+            timeout=HTTP_TIMEOUT,
+        )
+        if r.status_code == 404:
+            # component or database namespace not configured, nothing to report
+            return {}
+        r.raise_for_status()
+
+        content = r.content
+        if not content:
+            if not 200 <= r.status_code < 300:
+                # nothing to decode, but not a success either
+                raise requests.HTTPError(
+                    f"Empty response with status {r.status_code}", response=r
+                )
+            return {}
+
+        # decode the raw body directly, Moonraker always responds with UTF-8 JSON
+        return json.loads(content)
+
     def _get_all_webcams(
         self, host: str, port: int, apikey: str = None
-    ) -> list[schema.WebcamEntry]:
-        webcams = []
+    ) -> list[schema.ApiWebcamEntry]:
+        key = (host, port, apikey)
 
-        webcams += self._get_moonraker_webcams(host, port, apikey=apikey)
-        webcams += self._get_legacy_fluidd_webcams(host, port, apikey=apikey)
+        cached = self._webcam_cache
+        if cached is not None:
+            cached_key, expires, cached_webcams = cached
+            if cached_key == key and time.monotonic() < expires:
+                return cached_webcams
 
-        return webcams
-
-    def _get_moonraker_webcams(
-        self, host: str, port: int, apikey: str = None
-    ) -> list[schema.WebcamEntry]:
         headers = {}
         if apikey:
             headers["X-Api-Key"] = apikey
 
-        r = requests.post(
-            URL_WEBCAM_INFO_MOONRAKER.format(host=host, port=port), headers=headers
+        # both backends are independent, so query them in parallel
+        futures = [
+            self._webcam_executor.submit(fetcher, host, port, headers=headers)
+            for fetcher in (self._get_moonraker_webcams, self._get_legacy_fluidd_webcams)
+        ]
+
+        webcams = []
+        failed = False
+        for future in futures:
+            try:
+                webcams += future.result()
+            except Exception:
+                self._logger.exception(f"Error while fetching webcams from {host}:{port}")
+                failed = True
+
+        # don't hold on to an incomplete result, the next request should try again
+        if not failed:
+            self._webcam_cache = (key, time.monotonic() + WEBCAM_CACHE_TTL, webcams)
+        return webcams
+
+    def _get_moonraker_webcams(
+        self, host: str, port: int, headers: dict = None
+    ) -> list[schema.ApiWebcamEntry]:
+        data = self._query_moonraker(
+            "post", URL_WEBCAM_INFO_MOONRAKER, host, port, headers=headers
         )
-        data = r.json()
 
         base = f"http://{host}"
         webcams = []
         for webcam in data.get("webcams", []):
             try:
-                entry = schema.WebcamEntry(**webcam)
-                entry.snapshot_url = urljoin(base, entry.snapshot_url)
-                entry.stream_url = urljoin(base, entry.stream_url)
-                webcams.append(entry)
+                entry = schema.WebcamEntry.model_validate(webcam)
             except ValueError:
                 # invalid entry, ignore
                 continue
+
+            entry.snapshot_url = urljoin(base, entry.snapshot_url)
+            entry.stream_url = urljoin(base, entry.stream_url)
+            webcams.append(self._to_api_webcam(entry))
         return webcams
 
     def _get_legacy_fluidd_webcams(
-        self, host: str, port: int, apikey: str = None
-    ) -> list[schema.WebcamEntry]:
-        headers = {}
-        if apikey:
-            headers["X-Api-Key"] = apikey
-
-        r = requests.get(
-            URL_WEBCAM_INFO_FLUIDD_LEGACY.format(host=host, port=port),
-            headers=headers,
+        self, host: str, port: int, headers: dict = None
+    ) -> list[schema.ApiWebcamEntry]:
+        data = self._query_moonraker(
+            "get", URL_WEBCAM_INFO_FLUIDD_LEGACY, host, port, headers=headers
         )
-        data = r.json()
 
         if "result" not in data:
             return []
@@ -182,46 +294,41 @@ class MoonrakerConnectorPlugin(
         except ValueError:
             return []
 
+        base = f"http://{host}"
         result = []
         for camera in query_result.value.cameras:
             camera_type = FLUIDD_LEGACY_CAMERA_TYPES.get(camera.type, camera.type)
 
-            try:
-                webcam = schema.WebcamEntry(
-                    name=camera.name,
-                    location="printer",
-                    service=camera_type,
-                    enabled=True,
-                    icon="mdiWebcam",
-                    target_fps=camera.fpstarget,
-                    target_fps_idle=camera.fpsidletarget,
-                    snapshot_url=urljoin(f"http://{host}", camera.url),
-                    stream_url=urljoin(f"http://{host}", camera.url),
-                    flip_horizontal=camera.flipX,
-                    flip_vertical=camera.flipY,
-                    rotation=0,
-                    aspect_ratio="4:3",
-                    extra_data={},
-                    source="database",
-                    uid=camera.id,
-                )
-                self._set_mjpegstreamer_urls(webcam)
-                result.append(webcam)
-            except ValueError:
-                # invalid entry, ignore
-                continue
+            url = urljoin(base, camera.url)
+
+            # all values here stem from the already validated database item
+            webcam = schema.ApiWebcamEntry.model_construct(
+                key=camera.id,
+                name=camera.name,
+                service=camera_type,
+                enabled=True,
+                target_fps=camera.fpstarget,
+                target_fps_idle=camera.fpsidletarget,
+                stream_url=url,
+                snapshot_url=url,
+                flip_h=camera.flipX,
+                flip_v=camera.flipY,
+                rotation=0,
+                aspect_ratio="4:3",
+            )
+            self._set_mjpegstreamer_urls(webcam)
+            result.append(webcam)
 
         return result
 
-    def _set_mjpegstreamer_urls(self, webcam: schema.WebcamEntry) -> None:
+    def _set_mjpegstreamer_urls(self, webcam: schema.ApiWebcamEntry) -> None:
         if webcam.service in MJPEG_STREAMER_WEBCAM_SERVICES:
-            webcam.snapshot_url = set_url_query_param(
-                webcam.snapshot_url, "action", "snapshot"
-            )
-            webcam.stream_url = set_url_query_param(webcam.stream_url, "action", "stream")
+            webcam.snapshot_url = _mjpegstreamer_url(webcam.snapshot_url, "snapshot")
+            webcam.stream_url = _mjpegstreamer_url(webcam.stream_url, "stream")
 
     def _to_api_webcam(self, webcam: schema.WebcamEntry) -> schema.ApiWebcamEntry:
-        return schema.ApiWebcamEntry(
+        # source entry is already validated, no need to do that again
+        return schema.ApiWebcamEntry.model_construct(
             key=webcam.uid,
             name=webcam.name,
             service=webcam.service,
@@ -1,15 +1,21 @@
 import enum
 import io
 import logging
+import os
 import re
 import threading
 import time
 from collections import namedtuple
 from concurrent.futures import Future
-from typing import IO, Any, Literal, Optional, Union
+from typing import IO, Any, Literal, NamedTuple, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.fields import RequestField
+from urllib3.filepost import choose_boundary
+from urllib3.util import Retry
 
+from octoprint import __version__ as OCTOPRINT_VERSION
 from octoprint.schema import BaseModel, BaseModelExtra
 
 from .jsonrpc import WEBSOCKET_ERROR_CODE_NORMAL, WEBSOCKET_ERROR_CODES, JsonRpcClient
@@ -128,14 +134,10 @@ class Configfile(BaseModel):
     warnings: list[str] = []
 
 
-class TemperatureDataPoint:
+class TemperatureDataPoint(NamedTuple):
     actual: float = 0.0
     target: float = 0.0
 
-    def __init__(self, actual: float = 0.0, target: float = 0.0):
-        self.actual = actual
-        self.target = target
-
     def __str__(self):
         return f"{self.actual} / {self.target}"
 
@@ -143,6 +145,9 @@ class TemperatureDataPoint:
         return f"TemperatureDataPoint({self.actual}, {self.target})"
 
 
+NO_TEMPERATURE = TemperatureDataPoint()
+
+
 class KlipperState(enum.Enum):
     READY = "ready"
     ERROR = "error"
@@ -153,10 +158,7 @@ class KlipperState(enum.Enum):
 
     @classmethod
     def for_value(cls, value: str) -> "KlipperState":
-        for state in cls:
-            if state.value == value:
-                return state
-        return KlipperState.UNKNOWN
+        return cls._value2member_map_.get(value, cls.UNKNOWN)
 
 
 class PrinterState(enum.Enum):
@@ -170,10 +172,7 @@ class PrinterState(enum.Enum):
 
     @classmethod
     def for_value(cls, value: str) -> "PrinterState":
-        for state in cls:
-            if state.value == value:
-                return state
-        return cls.UNKNOWN
+        return cls._value2member_map_.get(value, cls.UNKNOWN)
 
 
 class IdleState(enum.Enum):
@@ -184,10 +183,7 @@ class IdleState(enum.Enum):
 
     @classmethod
     def for_value(cls, value: str) -> "IdleState":
-        for state in cls:
-            if state.value == value:
-                return state
-        return cls.UNKNOWN
+        return cls._value2member_map_.get(value, cls.UNKNOWN)
 
 
 class JobHistoryStatus(enum.Enum):
@@ -201,11 +197,8 @@ class JobHistoryStatus(enum.Enum):
     UNKNOWN = "unknown"
 
     @classmethod
-    def for_value(cls, value: str) -> "KlipperState":
-        for state in cls:
-            if state.value == value:
-                return state
-        return JobHistoryStatus.UNKNOWN
+    def for_value(cls, value: str) -> "JobHistoryStatus":
+        return cls._value2member_map_.get(value, cls.UNKNOWN)
 
 
 class MoonrakerClientListener:
@@ -252,7 +245,7 @@ class MoonrakerClientListener:
     def on_moonraker_idle_state(self, state: IdleState) -> None:
         pass
 
-    def on_moonraker_gcode_log(self, *line: str) -> None:
+    def on_moonraker_gcode_log(self, lines: list[str]) -> None:
         pass
 
     def on_moonraker_action_command(
@@ -275,18 +268,124 @@ MAX_HANDSHAKE_ATTEMPTS = 5
 
 TEMPERATURE_INTERVAL = 1.0
 
-MONITORED_FILE_ROOTS = ("gcodes",)
+HTTP_TIMEOUT = (5.0, 30.0)  # connect, read
+
+# Moonraker only answers an upload once it has written the whole file to disk
+UPLOAD_TIMEOUT = (5.0, 120.0)  # connect, read
+
+# only idempotent requests get retried, uploads are never resent
+HTTP_RETRIES = Retry(
+    total=3,
+    backoff_factor=0.2,
+    status_forcelist=(502, 503, 504),
+    raise_on_status=False,
+)
+
+FILELIST_REFRESH_DELAY = 0.2
+
+PRINT_STATUS_QUERY = {"objects": {"print_stats": None, "virtual_sdcard": None}}
+
+MONITORED_FILE_ROOTS = frozenset(("gcodes",))
 
 ACTION_PREFIX = "// action:"
+ACTION_REGEX = re.compile(
+    re.escape(ACTION_PREFIX) + r"\s*(?P<name>\S+)(?:\s+(?P<params>.*?))?\s*$",
+    flags=re.DOTALL,
+)
 
 IGNORED_DIRS = (".thumbs",)
 
-MACRO_PARAM_REGEX = re.compile(r"params\.(?P<name>\w+)", flags=re.IGNORECASE)
-MACRO_PARAM_DEFAULT_REGEX = re.compile(
-    r"\|default\(\s*(?P<value>(?P<quotechar>[\"'])(?:\\(?P=quotechar)|(?!(?P=quotechar)).)*(?P=quotechar)|-?\d[^,\)]*)"
+MACRO_PARAM_REGEX = re.compile(
+    r"params\.(?P<name>\w+)"
+    r"(?:\|default\(\s*(?P<value>(?P<quotechar>[\"'])(?:\\(?P=quotechar)|(?!(?P=quotechar)).)*(?P=quotechar)|-?\d[^,\)]*))?",
+    flags=re.IGNORECASE,
 )
 
 
+class MultipartUploadBody:
+    """
+    File like ``multipart/form-data`` body with a single file part that is read
+    from the provided handle on demand, so that uploads don't have to be buffered
+    in memory completely first.
+    """
+
+    def __init__(
+        self, fields: dict[str, str], name: str, filename: str, handle: IO, size: int
+    ):
+        boundary = choose_boundary()
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        head = b""
+        for key, value in fields.items():
+            head += self._part_header(boundary, key) + value.encode("utf-8") + b"\r\n"
+        head += self._part_header(
+            boundary, name, filename=filename, content_type="application/octet-stream"
+        )
+        tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+
+        self._parts = [io.BytesIO(head), handle, io.BytesIO(tail)]
+
+        # used by requests to determine the Content-Length
+        self.len = len(head) + size + len(tail)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            remaining = b"".join(part.read() for part in self._parts)
+            self._parts = []
+            return remaining
+
+        while self._parts:
+            chunk = self._parts[0].read(size)
+            if chunk:
+                return chunk
+            self._parts.pop(0)
+        return b""
+
+    @staticmethod
+    def _part_header(boundary: str, name: str, filename=None, content_type=None) -> bytes:
+        field = RequestField(name=name, data=b"", filename=filename)
+        field.make_multipart(content_type=content_type)
+        return f"--{boundary}\r\n".encode("ascii") + field.render_headers().encode(
+            "utf-8"
+        )
+
+
+class ResponseStream(io.RawIOBase):
+    """
+    Read only file like view of a streamed response body, that closes the whole
+    response (and thus hands its connection back to the pool) on close.
+    """
+
+    def __init__(self, response: requests.Response):
+        self._response = response
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self._response.raw.read()
+        return self._response.raw.read(size)
+
+    def readinto(self, buffer) -> int:
+        return self._response.raw.readinto(buffer)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._response.close()
+        super().close()
+
+
+def remaining_size(handle: IO) -> Optional[int]:
+    try:
+        position = handle.tell()
+        end = handle.seek(0, os.SEEK_END)
+        handle.seek(position)
+        return end - position
+    except (AttributeError, OSError):
+        return None
+
+
 class MoonrakerClient(JsonRpcClient):
     WEBSOCKET_URL = "ws://{host}:{port}/websocket"
     HTTP_URL = "http://{host}:{port}"
@@ -296,25 +395,25 @@ class MoonrakerClient(JsonRpcClient):
     FILAMENT_SWITCH_SENSOR_PREFIX = "filament_switch_sensor "
     FILAMENT_MOTION_SENSOR_PREFIX = "filament_motion_sensor "
 
-    RELEVANT_PRINTER_OBJECTS = (
-        "configfile",
-        "display_status",
-        "extruder",
-        "gcode_move",
-        "hall_filament_width_sensor",
-        "heater_bed",
-        "idle_timeout",
-        "pause_resume",
-        "print_stats",
-        "virtual_sdcard",
-        lambda obj_list: [
-            x
-            for x in obj_list
-            if x.startswith(MoonrakerClient.GENERIC_HEATER_PREFIX)
-            or x.startswith(MoonrakerClient.MACRO_PREFIX)
-            or x.startswith(MoonrakerClient.FILAMENT_SWITCH_SENSOR_PREFIX)
-            or x.startswith(MoonrakerClient.FILAMENT_MOTION_SENSOR_PREFIX)
-        ],
+    RELEVANT_PRINTER_OBJECTS = frozenset(
+        (
+            "configfile",
+            "display_status",
+            "extruder",
+            "gcode_move",
+            "hall_filament_width_sensor",
+            "heater_bed",
+            "idle_timeout",
+            "pause_resume",
+            "print_stats",
+            "virtual_sdcard",
+        )
+    )
+    RELEVANT_PRINTER_OBJECT_PREFIXES = (
+        GENERIC_HEATER_PREFIX,
+        MACRO_PREFIX,
+        FILAMENT_SWITCH_SENSOR_PREFIX,
+        FILAMENT_MOTION_SENSOR_PREFIX,
     )
 
     def __init__(
@@ -335,43 +434,70 @@ class MoonrakerClient(JsonRpcClient):
         self._apikey = apikey
         self._listener = listener
         self._connection_id = None
+        self._http_url = self.HTTP_URL.format(host=host, port=port)
 
         self._klipper_state: KlipperState = KlipperState.UNKNOWN
         self._klipper_state_subscription = False
         self._subbed_objs: list[str] = []
+        self._subbed_objs_params: dict[str, Any] = {"objects": {}}
 
         self._log_history_received = False
 
-        self._heaters: list[str] = []
+        self._heaters: dict[str, str] = {}  # printer object -> heater name
         self._current_temperatures: dict[str, TemperatureDataPoint] = {}
+        # copy on write, readers take a reference and never see it change
+        self._print_status: dict[str, dict[str, Any]] = {
+            obj: {} for obj in PRINT_STATUS_QUERY["objects"]
+        }
+        self._print_status_lock = threading.Lock()
         self._last_temperature_update = None
+        self._temperature_update_timer: Optional[threading.Timer] = None
+        self._temperature_update_lock = threading.Lock()
 
+        # all changes to the tree and its flat views happen under this lock, both
+        # from refreshes and from filelist notifications
+        self._tree_lock = threading.RLock()
+        self._tree_generation = 0  # bumped whenever entries are removed locally
         self._current_tree: dict[str, dict[str, InternalFile]] = {}
+        self._pending_refreshes: dict[tuple[str, str], bool] = {}
+        self._pending_refreshes_timer: Optional[threading.Timer] = None
+        self._pending_refreshes_lock = threading.Lock()
+        self._current_files: dict[str, InternalFile] = {}  # flat view, keyed by path
+        self._file_sources: dict[str, dict[str, Any]] = {}  # raw data per file path
         self._current_usage: Optional[DiskUsage] = None
 
         self._job_history: dict[str, JobHistory] = {}
 
         self._current_configfile: Configfile = None
+        self._current_configfile_source: tuple[dict[str, Any], list[str]] = None
         self._current_macros: dict[str, dict[str, Any]] = {}
 
         self._handshake_attempt = 0
 
         self._upload_lock = threading.RLock()
 
+        # shared session for uploads & downloads, to reuse connections to Moonraker
+        self._http = requests.Session()
+        self._http.mount(
+            "http://",
+            HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=HTTP_RETRIES),
+        )
+        if self._apikey:
+            self._http.headers["X-Api-Key"] = self._apikey
+
     @property
     def klipper_state(self) -> KlipperState:
         return self._klipper_state
 
     @klipper_state.setter
     def klipper_state(self, value: KlipperState) -> None:
-        if value == self.klipper_state:
+        old_state = self._klipper_state
+        if value is old_state:
             return
 
-        old_state = self.klipper_state
-
         self._klipper_state = value
 
-        if old_state != KlipperState.READY and value == KlipperState.READY:
+        if value is KlipperState.READY:
             self.attempt_handshake(reset=True)
 
     @property
@@ -382,6 +508,10 @@ class MoonrakerClient(JsonRpcClient):
     def current_tree(self) -> dict[str, dict[str, InternalFile]]:
         return self._current_tree
 
+    @property
+    def current_files(self) -> dict[str, InternalFile]:
+        return self._current_files
+
     @property
     def current_usage(self) -> Optional[DiskUsage]:
         return self._current_usage
@@ -394,6 +524,23 @@ class MoonrakerClient(JsonRpcClient):
     def current_macros(self) -> dict[str, dict[str, Any]]:
         return self._current_macros
 
+    def disconnect(self):
+        with self._temperature_update_lock:
+            if self._temperature_update_timer is not None:
+                self._temperature_update_timer.cancel()
+                self._temperature_update_timer = None
+
+        with self._pending_refreshes_lock:
+            if self._pending_refreshes_timer is not None:
+                self._pending_refreshes_timer.cancel()
+                self._pending_refreshes_timer = None
+            self._pending_refreshes.clear()
+
+        self._reset_print_status()
+
+        super().disconnect()
+        self._http.close()
+
     def on_open(self, *args, **kwargs):
         try:
             super().on_open(*args, **kwargs)
@@ -438,8 +585,6 @@ class MoonrakerClient(JsonRpcClient):
     def identify_connection(
         self, cb=None, cb_args: tuple = None, cb_kwargs: dict[str, Any] = None
     ) -> None:
-        from octoprint import __version__ as octoprint_version
-
         def on_connection_identified(future: Future) -> None:
             try:
                 result = future.result()
@@ -466,7 +611,7 @@ class MoonrakerClient(JsonRpcClient):
 
         payload = {
             "client_name": "OctoPrint",
-            "version": octoprint_version,
+            "version": OCTOPRINT_VERSION,
             "type": "web",
             "url": "https://octoprint.org",
         }
@@ -495,41 +640,47 @@ class MoonrakerClient(JsonRpcClient):
             )
             return
 
-        def on_server_info(future: Future) -> None:
-            try:
-                server_info = future.result()
-
-                self._klipper_state = KlipperState.for_value(
-                    server_info.get("klippy_state", "unknown")
-                )
+        # the handshake waits on several consecutive calls, so it runs on its own
+        # thread instead of blocking one of the response workers
+        threading.Thread(
+            target=self._handshake,
+            name="Moonraker handshake",
+            daemon=True,
+        ).start()
 
-                if self.klipper_state == KlipperState.READY:
-                    # proceed with connection
-                    self._listener.on_moonraker_server_info(server_info)
+    def _handshake(self) -> None:
+        try:
+            server_info = self.call_method("server.info").result(timeout=self._timeout)
+        except Exception as exc:
+            self._logger.exception("Error while retrieving server info")
+            error_str = f"Error while retrieving server info: {str(exc)}. Please check moonraker.log for details."
+            self._listener.on_moonraker_disconnected(error=error_str)
+            return
 
-                    moonraker_version = server_info.get("moonraker_version")
-                    api_version = server_info.get("api_version_string")
-                    self._dual_log(
-                        logging.INFO,
-                        f"Connected to Moonraker {moonraker_version}, API version {api_version}",
-                    )
+        self._klipper_state = KlipperState.for_value(
+            server_info.get("klippy_state", "unknown")
+        )
 
-                    self.fetch_console_history()
-                    self.fetch_job_history()
-                    self.subscribe_to_updates()
+        if self._klipper_state is not KlipperState.READY:
+            # log error
+            error = KLIPPER_STATE_ERROR_LOOKUP.get(self._klipper_state)
+            self._listener.on_moonraker_gcode_log([f"!!! {error}"])
+            self._dual_log(logging.ERROR, error)
+            return
 
-                else:
-                    # log error
-                    error = KLIPPER_STATE_ERROR_LOOKUP.get(self._klipper_state)
-                    self._listener.on_moonraker_gcode_log(f"!!! {error}")
-                    self._dual_log(logging.ERROR, error)
+        # proceed with connection
+        self._listener.on_moonraker_server_info(server_info)
 
-            except Exception as exc:
-                self._logger.exception("Error while retrieving server info")
-                error_str = f"Error while retrieving server info: {str(exc)}. Please check moonraker.log for details."
-                self._listener.on_moonraker_disconnected(error=error_str)
+        moonraker_version = server_info.get("moonraker_version")
+        api_version = server_info.get("api_version_string")
+        self._dual_log(
+            logging.INFO,
+            f"Connected to Moonraker {moonraker_version}, API version {api_version}",
+        )
 
-        self.call_method("server.info").add_done_callback(on_server_info)
+        self.fetch_console_history()
+        self.fetch_job_history()
+        self.subscribe_to_updates()
 
     def subscribe_to_updates(self) -> None:
         # subscribe to some status notifications
@@ -540,67 +691,66 @@ class MoonrakerClient(JsonRpcClient):
 
         # and finally subscribe to the printer objects we are interested in
 
-        def on_printer_objects(future: Future) -> None:
-            try:
-                printer_objects = future.result()
-
-                obj_list = printer_objects.get("objects", [])
-
-                matched_objs = []
-                for obj in self.RELEVANT_PRINTER_OBJECTS:
-                    if isinstance(obj, str) and obj in obj_list:
-                        matched_objs.append(obj)
-
-                    elif callable(obj):
-                        matched = obj(obj_list)
-                        matched_objs += matched
-
-                if matched_objs:
-                    subbed_objs = [
-                        obj
-                        for obj in matched_objs
-                        if obj != "configfile" and not obj.startswith(self.MACRO_PREFIX)
-                    ]
-
-                    self._subbed_objs = subbed_objs
-                    self._heaters = [
-                        obj
-                        for obj in matched_objs
-                        if obj in ("extruder", "heater_bed")
-                        or obj.startswith(self.GENERIC_HEATER_PREFIX)
-                    ]
+        try:
+            printer_objects = self.call_method("printer.objects.list").result(
+                timeout=self._timeout
+            )
 
-                    self.query_printer_objects(matched_objs)
+            obj_list = printer_objects.get("objects", [])
 
-                    # subscribe to all relevant objects
-                    self.subscribe_printer_objects(subbed_objs).add_done_callback(
-                        on_printer_objects_subscribed
-                    )
-
-            except Exception as exc:
-                self._logger.exception("Error while retrieving printer objects")
-                error_str = f"Error while retrieving printer objects: {str(exc)}"
-                self._listener.on_moonraker_disconnected(error=error_str)
+            matched_objs = [
+                obj
+                for obj in obj_list
+                if obj in self.RELEVANT_PRINTER_OBJECTS
+                or obj.startswith(self.RELEVANT_PRINTER_OBJECT_PREFIXES)
+            ]
+            if not matched_objs:
+                return
 
-        def on_printer_objects_subscribed(future: Future) -> None:
-            try:
-                future.result()
-                self._listener.on_moonraker_connected()
+            subbed_objs = [
+                obj
+                for obj in matched_objs
+                if obj != "configfile" and not obj.startswith(self.MACRO_PREFIX)
+            ]
+
+            self._subbed_objs = subbed_objs
+            self._subbed_objs_params = {"objects": dict.fromkeys(subbed_objs)}
+            self._heaters = {
+                obj: obj[len(self.GENERIC_HEATER_PREFIX) :]
+                if obj.startswith(self.GENERIC_HEATER_PREFIX)
+                else obj
+                for obj in matched_objs
+                if obj in ("extruder", "heater_bed")
+                or obj.startswith(self.GENERIC_HEATER_PREFIX)
+            }
+
+            self.query_printer_objects(matched_objs)
+
+        except Exception as exc:
+            self._logger.exception("Error while retrieving printer objects")
+            error_str = f"Error while retrieving printer objects: {str(exc)}"
+            self._listener.on_moonraker_disconnected(error=error_str)
+            return
 
-            except Exception as exc:
-                self._logger.exception("Error while subscribing to printer objects")
-                error_str = f"Error while subscribing to printer objects: {str(exc)}"
-                self._listener.on_moonraker_disconnected(error=error_str)
-                return
+        # subscribe to all relevant objects
+        try:
+            self.subscribe_printer_objects().result(timeout=self._timeout)
+        except Exception as exc:
+            self._logger.exception("Error while subscribing to printer objects")
+            error_str = f"Error while subscribing to printer objects: {str(exc)}"
+            self._listener.on_moonraker_disconnected(error=error_str)
+            return
 
-        self.call_method("printer.objects.list").add_done_callback(on_printer_objects)
+        self._listener.on_moonraker_connected()
 
     ##~~ Method calls & callbacks
 
     def query_printer_objects(self, objs: list[str] = None) -> Future:
         if objs is None:
-            objs = self._subbed_objs
+            return self._query_printer_objects(self._subbed_objs_params)
+        return self._query_printer_objects({"objects": dict.fromkeys(objs)})
 
+    def _query_printer_objects(self, params: dict[str, Any]) -> Future:
         def on_result(future: Future) -> None:
             try:
                 result = future.result()
@@ -617,18 +767,29 @@ class MoonrakerClient(JsonRpcClient):
             except Exception:
                 self._logger.exception("Error while querying printer objects")
 
-        params = {"objects": dict.fromkeys(objs)}
         future = self.call_method("printer.objects.query", params=params)
         future.add_done_callback(on_result)
         return future
 
     def subscribe_printer_objects(self, objs: list[str] = None) -> Future:
         if objs is None:
-            objs = self._subbed_objs
-
-        params = {"objects": dict.fromkeys(objs)}
+            params = self._subbed_objs_params
+        else:
+            params = {"objects": dict.fromkeys(objs)}
         return self.call_method("printer.objects.subscribe", params=params)
 
+    def cached_print_status(self) -> Optional[tuple[PrintStats, SDCardStats]]:
+        status = self._print_status
+        print_stats = status["print_stats"]
+        virtual_sdcard = status["virtual_sdcard"]
+        if not print_stats.get("filename") or virtual_sdcard.get("file_size") is None:
+            return None
+        return PrintStats(**print_stats), SDCardStats(**virtual_sdcard)
+
+    def _reset_print_status(self) -> None:
+        with self._print_status_lock:
+            self._print_status = {obj: {} for obj in self._print_status}
+
     def query_print_status(self) -> Future[tuple[PrintStats, SDCardStats]]:
         result_future = Future()
 
@@ -651,9 +812,7 @@ class MoonrakerClient(JsonRpcClient):
             except Exception as exc:
                 result_future.set_exception(exc)
 
-        self.query_printer_objects(["print_stats", "virtual_sdcard"]).add_done_callback(
-            on_status
-        )
+        self._query_printer_objects(PRINT_STATUS_QUERY).add_done_callback(on_status)
         return result_future
 
     def fetch_console_history(self, count: int = 100, force: bool = False) -> Future:
@@ -676,20 +835,20 @@ class MoonrakerClient(JsonRpcClient):
                         continue
 
                     if entry["type"] == "command":
-                        lines += self._to_multiline_loglines(
-                            ">>>", *entry["message"].split("\n")
-                        )
+                        prefix = ">>>"
                     elif entry["type"] == "response":
-                        lines += self._to_multiline_loglines(
-                            "<<<", *entry["message"].split("\n")
-                        )
+                        prefix = "<<<"
+                    else:
+                        continue
 
-                if lines:
-                    self._listener.on_moonraker_gcode_log(
-                        "--- 8< --- Begin of console history --- 8< ---",
-                        *lines,
-                        "--- 8< --- End of console history --- 8< ---",
+                    lines.extend(
+                        self._to_multiline_loglines(prefix, entry["message"].split("\n"))
                     )
+
+                if lines:
+                    lines.insert(0, "--- 8< --- Begin of console history --- 8< ---")
+                    lines.append("--- 8< --- End of console history --- 8< ---")
+                    self._listener.on_moonraker_gcode_log(lines)
                 self._log_history_received = True
 
             except Exception:
@@ -702,7 +861,7 @@ class MoonrakerClient(JsonRpcClient):
     # commands
 
     def send_gcode_commands(self, *commands: str) -> Future:
-        if "M112" in commands:
+        if any(command.strip().upper() == "M112" for command in commands):
             return self.trigger_emergency_stop()
         return self.send_gcode_script("\n".join(commands))
 
@@ -711,13 +870,13 @@ class MoonrakerClient(JsonRpcClient):
             return
 
         self._listener.on_moonraker_gcode_log(
-            *self._to_multiline_loglines(">>>", *script.split("\n"))
+            self._to_multiline_loglines(">>>", script.split("\n"))
         )
 
         def on_result(future: Future) -> None:
             try:
                 result = future.result()
-                self._listener.on_moonraker_gcode_log(f"<<< {result}")
+                self._listener.on_moonraker_gcode_log([f"<<< {result}"])
             except Exception:
                 self._logger.exception("Error while sending GCODE commands to printer")
 
@@ -726,20 +885,21 @@ class MoonrakerClient(JsonRpcClient):
         return future
 
     def trigger_emergency_stop(self) -> Future:
-        self._listener.on_moonraker_gcode_log("--- Triggering an Emergency Stop!")
+        self._listener.on_moonraker_gcode_log(["--- Triggering an Emergency Stop!"])
         return self.call_method("printer.emergency_stop")
 
     def trigger_host_restart(self) -> Future:
-        self._listener.on_moonraker_gcode_log(">>> RESTART")
+        self._listener.on_moonraker_gcode_log([">>> RESTART"])
         return self.call_method("printer.restart")
 
     def trigger_firmware_restart(self) -> Future:
-        self._listener.on_moonraker_gcode_log(">>> FIRMWARE_RESTART")
+        self._listener.on_moonraker_gcode_log([">>> FIRMWARE_RESTART"])
         return self.call_method("printer.firmware_restart")
 
     # print job management
 
     def start_print(self, path: str) -> Future:
+        self._reset_print_status()
         return self.call_method("printer.print.start", params={"filename": path})
 
     def pause_print(self) -> Future:
@@ -760,37 +920,18 @@ class MoonrakerClient(JsonRpcClient):
         recursive=False,
         parent: Optional[DirInfo] = None,
         modified: bool = False,
+        request: Optional[Future] = None,
+        generation: Optional[int] = None,
     ) -> Future:
         refresh_tree_result = Future()
 
-        if root not in ("gcodes"):
+        if root not in MONITORED_FILE_ROOTS:
             exc = ValueError(f"refreshed root {root} is currently not supported")
             refresh_tree_result.set_exception(exc)
             return refresh_tree_result
 
-        def update_parent_info(timestamp: Optional[float] = None) -> None:
-            nonlocal path
-
-            tree = self._current_tree.get(path)
-            if not tree:
-                return
-
-            p = tree.get(".")
-            if not p:
-                return
-
-            total = 0
-            last_modified = -1
-            for name, item in tree.items():
-                if name == ".":
-                    continue
-                total += item.size
-                if item.modified > last_modified:
-                    last_modified = item.modified
-
-            if timestamp or last_modified >= 0:
-                p.modified = timestamp if timestamp else last_modified
-            p.size = total
+        if generation is None:
+            generation = self._tree_generation
 
         def on_result(future: Future) -> None:
             nonlocal path
@@ -805,34 +946,31 @@ class MoonrakerClient(JsonRpcClient):
 
                 self._current_usage = DiskUsage(**info.get("disk_usage"))
 
-                internal_files = [
-                    InternalFile(path=f"{prefix}{f['filename']}", **f)
-                    for f in info.get("files")
-                ]
+                with self._tree_lock:
+                    stale = self._tree_generation != generation
+                    if not stale:
+                        self._apply_listing(path, prefix, info.get("files"), parent)
+
+                if stale:
+                    # entries got removed while this listing was in flight, it might
+                    # still contain them, so ask again instead of resurrecting them
+                    retry = self._refresh_tree(
+                        root=root,
+                        path=path,
+                        recursive=recursive,
+                        parent=parent,
+                        modified=modified,
+                    )
 
-                dot_entry = self._current_tree.get(path, {}).get(
-                    "."
-                )  # rescue . before replacing subtree
-                self._current_tree[path] = {f.filename: f for f in internal_files}
+                    def retried(f: Future) -> None:
+                        exc = f.exception()
+                        if exc is not None:
+                            refresh_tree_result.set_exception(exc)
+                        else:
+                            refresh_tree_result.set_result(f.result())
 
-                if parent:
-                    # add . from provided parent
-                    self._current_tree[path]["."] = InternalFile(
-                        path=f"{prefix}.",
-                        filename=".",
-                        modified=parent.modified,
-                        size=parent.size,
-                    )
-                elif dot_entry:
-                    # recover . from rescued one
-                    self._current_tree[path]["."] = dot_entry
-                else:
-                    self._current_tree[path]["."] = InternalFile(
-                        path=f"{prefix}.",
-                        filename=".",
-                        modified=time.time(),
-                        size=0,
-                    )
+                    retry.add_done_callback(retried)
+                    return
 
                 dirs = [
                     DirInfo(**d)
@@ -840,50 +978,205 @@ class MoonrakerClient(JsonRpcClient):
                     if d["dirname"] not in IGNORED_DIRS
                 ]
                 if dirs and recursive:
+                    # fetch all subdirectories of this level through a single batch
+                    subpaths = [f"{prefix}{d.dirname}" for d in dirs]
+                    batch_generation = self._tree_generation
+                    dir_requests = self.call_batch(
+                        [
+                            (
+                                "server.files.get_directory",
+                                self._get_directory_params(root, p),
+                            )
+                            for p in subpaths
+                        ]
+                    )
                     futures = [
                         self._refresh_tree(
                             root=root,
-                            path=f"{prefix}{d.dirname}",
+                            path=p,
                             recursive=recursive,
                             parent=d,
+                            request=r,
+                            generation=batch_generation,
                         )
-                        for d in dirs
+                        for p, d, r in zip(subpaths, dirs, dir_requests)
                     ]
 
-                    def fetched(f: Future) -> None:
-                        try:
-                            f.result()
-                            futures.remove(f)
-                        except Exception as exc:
-                            refresh_tree_result.set_exception(exc)
+                    pending = len(futures)
+                    pending_lock = threading.Lock()
 
-                        if len(futures) == 0:
-                            update_parent_info(
-                                timestamp=time.time() if modified else None
-                            )
-                            refresh_tree_result.set_result(self._current_tree)
+                    def fetched(f: Future) -> None:
+                        nonlocal pending
+
+                        with pending_lock:
+                            pending -= 1
+                            if refresh_tree_result.done():
+                                # an earlier subtree already failed
+                                return
+
+                            exc = f.exception()
+                            if exc is not None:
+                                refresh_tree_result.set_exception(exc)
+                            elif pending == 0:
+                                self._update_parent_info(
+                                    path, timestamp=time.time() if modified else None
+                                )
+                                refresh_tree_result.set_result(self._current_tree)
 
                     for f in futures:
                         f.add_done_callback(fetched)
 
                 else:
-                    update_parent_info(timestamp=time.time() if modified else None)
+                    self._update_parent_info(
+                        path, timestamp=time.time() if modified else None
+                    )
                     refresh_tree_result.set_result(self._current_tree)
 
             except Exception as exc:
                 self._logger.exception(
                     f"Error while fetching directory information for {root}/{path}"
                 )
-                refresh_tree_result.exception(exc)
+                if not refresh_tree_result.done():
+                    refresh_tree_result.set_exception(exc)
 
-        future = self.call_method(
-            "server.files.get_directory",
-            params={"path": f"{root}/{path}", "extended": True},
-        )
-        future.add_done_callback(on_result)
+        if request is None:
+            request = self.call_method(
+                "server.files.get_directory",
+                params=self._get_directory_params(root, path),
+            )
+        request.add_done_callback(on_result)
 
         return refresh_tree_result
 
+    def _apply_listing(
+        self,
+        path: str,
+        prefix: str,
+        files: list[dict[str, Any]],
+        parent: Optional[DirInfo],
+    ) -> None:
+        # caller holds the tree lock
+        internal_files = [
+            self._to_internal_file(f"{prefix}{f['filename']}", f) for f in files
+        ]
+
+        dot_entry = self._current_tree.get(path, {}).get(
+            "."
+        )  # rescue . before replacing subtree
+        subtree = {f.filename: f for f in internal_files}
+
+        if parent:
+            # add . from provided parent
+            subtree["."] = InternalFile(
+                path=f"{prefix}.",
+                filename=".",
+                modified=parent.modified,
+                size=parent.size,
+            )
+        elif dot_entry:
+            # recover . from rescued one
+            subtree["."] = dot_entry
+        else:
+            subtree["."] = InternalFile(
+                path=f"{prefix}.",
+                filename=".",
+                modified=time.time(),
+                size=0,
+            )
+
+        self._replace_subtree(path, subtree)
+
+    def _update_parent_info(self, path: str, timestamp: Optional[float] = None) -> None:
+        with self._tree_lock:
+            tree = self._current_tree.get(path)
+            if not tree:
+                return
+
+            p = tree.get(".")
+            if not p:
+                return
+
+            total = 0
+            last_modified = -1
+            for name, item in tree.items():
+                if name == ".":
+                    continue
+                total += item.size
+                if item.modified > last_modified:
+                    last_modified = item.modified
+
+            if timestamp or last_modified >= 0:
+                p.modified = timestamp if timestamp else last_modified
+            p.size = total
+
+    def _add_empty_subtree(self, path: str, modified: Optional[float] = None) -> None:
+        with self._tree_lock:
+            if path in self._current_tree:
+                return
+
+            self._replace_subtree(
+                path,
+                {
+                    ".": InternalFile(
+                        path=f"{path}/.",
+                        filename=".",
+                        modified=modified if modified is not None else time.time(),
+                        size=0,
+                    )
+                },
+            )
+
+    def _remove_file(self, path: str) -> None:
+        parent, _, name = path.rpartition("/")
+        with self._tree_lock:
+            self._tree_generation += 1
+
+            tree = self._current_tree.get(parent)
+            if not tree or tree.pop(name, None) is None:
+                return
+
+            self._current_files.pop(path, None)
+            self._file_sources.pop(path, None)
+            self._update_parent_info(parent, timestamp=time.time())
+
+    def _remove_subtree(self, path: str) -> None:
+        prefix = f"{path}/"
+        with self._tree_lock:
+            self._tree_generation += 1
+
+            for p in list(self._current_tree):
+                if p != path and not p.startswith(prefix):
+                    continue
+
+                for f in self._current_tree.pop(p, {}).values():
+                    self._current_files.pop(f.path, None)
+                    self._file_sources.pop(f.path, None)
+
+    def _replace_subtree(self, path: str, subtree: dict[str, InternalFile]) -> None:
+        with self._tree_lock:
+            previous = self._current_tree.get(path, {})
+            self._current_tree[path] = subtree
+
+            for name, f in previous.items():
+                if name not in subtree:
+                    self._current_files.pop(f.path, None)
+                    self._file_sources.pop(f.path, None)
+            self._current_files.update({f.path: f for f in subtree.values()})
+
+    def _to_internal_file(self, path: str, data: dict[str, Any]) -> InternalFile:
+        # reuse the existing model if Moonraker reports exactly the same data as
+        # last time - comparing two dicts is way cheaper than validating a new model
+        existing = self._current_files.get(path)
+        if existing is not None and self._file_sources.get(path) == data:
+            return existing
+
+        internal = InternalFile(path=path, **data)
+        self._file_sources[path] = data
+        return internal
+
+    def _get_directory_params(self, root: str, path: str) -> dict[str, Any]:
+        return {"path": f"{root}/{path}", "extended": True}
+
     def refresh_tree(
         self, root="gcodes", path="", recursive=False, modified=False
     ) -> Future:
@@ -947,13 +1240,21 @@ class MoonrakerClient(JsonRpcClient):
                     handle = open(handle, "rb")
 
                 headers = {}
-                if self._apikey:
-                    headers["X-Api-Key"] = self._apikey
+                url = f"{self._http_url}/server/files/upload"
 
-                url = (
-                    self.HTTP_URL.format(host=self._host, port=self._port)
-                    + "/server/files/upload"
-                )
+                fields = {"root": root, "path": folder}
+
+                size = remaining_size(handle)
+                if size is not None:
+                    # stream the file instead of reading it into memory
+                    body = MultipartUploadBody(fields, "file", filename, handle, size)
+                    headers["Content-Type"] = body.content_type
+                    request_kwargs = {"data": body}
+                else:
+                    request_kwargs = {
+                        "files": {"file": (filename, handle)},
+                        "data": fields,
+                    }
 
                 with self._upload_lock:
                     # The upload endpoint on Moonraker doesn't appear to be thread safe, at least not on my test device...
@@ -961,11 +1262,8 @@ class MoonrakerClient(JsonRpcClient):
                     # we even if that is fixed in current versions (haven't checked...), given that Moonraker just like
                     # Marlin before it now gets rolled out with sold printers out there and then probably never updated
                     # again by the user, we need a workaround.
-                    response = requests.post(
-                        url,
-                        headers=headers,
-                        files={"file": (filename, handle)},
-                        data={"root": root, "path": folder},
+                    response = self._http.post(
+                        url, headers=headers, timeout=UPLOAD_TIMEOUT, **request_kwargs
                     )
                 response.raise_for_status()
 
@@ -989,17 +1287,19 @@ class MoonrakerClient(JsonRpcClient):
         return future
 
     def download_file(self, path: str, root: str = "gcodes") -> requests.Response:
-        headers = {}
-        if self._apikey:
-            headers["X-Api-Key"] = self._apikey
-
-        url = (
-            self.HTTP_URL.format(host=self._host, port=self._port)
-            + f"/server/files/{root}/{path}"
+        url = f"{self._http_url}/server/files/{root}/{path}"
+
+        # callers read straight from response.raw, so ask for the file as is instead
+        # of having it compressed on the fly, and decode anyway should the server
+        # still insist on an encoding
+        response = self._http.get(
+            url,
+            headers={"Accept-Encoding": "identity"},
+            stream=True,
+            timeout=HTTP_TIMEOUT,
         )
-
-        response = requests.get(url, headers=headers, stream=True)
         response.raise_for_status()
+        response.raw.decode_content = True
 
         return response
 
@@ -1008,6 +1308,11 @@ class MoonrakerClient(JsonRpcClient):
             "server.files.delete_file", params={"path": f"{root}/{path}"}
         )
 
+    def delete_files(self, paths: list[str], root: str = "gcodes") -> list[Future]:
+        return self.call_batch(
+            [("server.files.delete_file", {"path": f"{root}/{path}"}) for path in paths]
+        )
+
     def create_folder(self, path: str, root: str = "gcodes") -> Future:
         return self.call_method(
             "server.files.post_directory", params={"path": f"{root}/{path}"}
@@ -1033,6 +1338,25 @@ class MoonrakerClient(JsonRpcClient):
             params={"source": f"{src_root}/{src_path}", "dest": f"{dst_root}/{dst_path}"},
         )
 
+    def move_paths(
+        self,
+        paths: list[tuple[str, str]],
+        src_root: str = "gcodes",
+        dst_root: str = "gcodes",
+    ) -> list[Future]:
+        return self.call_batch(
+            [
+                (
+                    "server.files.move",
+                    {
+                        "source": f"{src_root}/{src_path}",
+                        "dest": f"{dst_root}/{dst_path}",
+                    },
+                )
+                for src_path, dst_path in paths
+            ]
+        )
+
     def copy_path(
         self,
         src_path: str,
@@ -1061,66 +1385,139 @@ class MoonrakerClient(JsonRpcClient):
             self.klipper_state = KlipperState.SHUTDOWN
 
     def on_printer_update(self, _, params):
-        payload, _ = params
-        self._process_update(payload)
+        # params is [status, eventtime]
+        self._process_update(params[0])
 
     def on_filelist_changed(self, _, params):
-        assert isinstance(params, list)
+        if not isinstance(params, list):
+            self._logger.warning(
+                f"Ignoring unexpected filelist change params: {params!r}"
+            )
+            return
 
         to_refresh = []
+        to_notify = []
+
+        def monitored_path(item) -> Optional[tuple[str, str]]:
+            if not item:
+                return None
 
-        def enqueue_refresh(item, target_parent=True) -> None:
             root = item.get("root")
             if root not in MONITORED_FILE_ROOTS:
-                return
+                return None
 
             path = item.get("path")
             if path is None:
-                return
+                return None
 
-            if target_parent:
-                if "/" in path:
-                    path, _ = path.rsplit("/", 1)
-                else:
-                    path = ""
+            return root, path
 
-            to_refresh.append((root, path))
+        def parent_of(path: str) -> str:
+            idx = path.rfind("/")
+            return path[:idx] if idx >= 0 else ""
 
-        for entry in params:
-            action = entry.get("action")
-            if action is None:
-                continue
+        # apply the whole batch at once so no refresh result can land in between
+        with self._tree_lock:
+            for entry in params:
+                action = entry.get("action")
+                if action is None:
+                    continue
 
-            item = entry.get("item")
-            if item is None:
-                continue
+                item = monitored_path(entry.get("item"))
+                source_item = monitored_path(entry.get("source_item"))
+
+                # removals get applied to the local tree directly, only new or modified
+                # entries need to be fetched from Moonraker to get their metadata
+
+                if action == "delete_file" and item:
+                    root, path = item
+                    self._remove_file(path)
+                    to_notify.append((root, parent_of(path)))
+
+                elif action == "delete_dir" and item:
+                    root, path = item
+                    self._remove_subtree(path)
+                    to_notify.append((root, parent_of(path)))
+
+                elif action == "create_dir" and item:
+                    root, path = item
+                    self._add_empty_subtree(path, entry["item"].get("modified"))
+                    to_notify.append((root, parent_of(path)))
+
+                elif action == "move_file":
+                    if source_item:
+                        root, path = source_item
+                        self._remove_file(path)
+                        to_notify.append((root, parent_of(path)))
+                    if item:
+                        root, path = item
+                        to_refresh.append((root, parent_of(path), False))
+
+                elif action == "move_dir":
+                    if source_item:
+                        root, path = source_item
+                        self._remove_subtree(path)
+                        to_notify.append((root, parent_of(path)))
+                    if item:
+                        root, path = item
+                        to_refresh.append((root, path, True))
+
+                elif item:
+                    # create_file, modify_file & anything else
+                    root, path = item
+                    if action.endswith("_file"):
+                        path = parent_of(path)
+                    to_refresh.append((root, path, False))
+
+        refreshed = {(root, path) for root, path, _ in to_refresh}
+        for root, path in to_notify:
+            if (root, path) not in refreshed:
+                self._listener.on_moonraker_file_tree_updated(
+                    root, path, self._current_tree
+                )
 
-            enqueue_refresh(item, target_parent=(action.endswith("_file")))
+        if to_refresh:
+            self._schedule_refreshes(to_refresh)
+
+    def _schedule_refreshes(self, refreshes: list[tuple[str, str, bool]]) -> None:
+        # bursts of changes (e.g. a slicer upload plus metadata & thumbnails) are
+        # collected for a short while and then refreshed once per folder
+        with self._pending_refreshes_lock:
+            for root, path, recursive in refreshes:
+                key = (root, path)
+                self._pending_refreshes[key] = (
+                    self._pending_refreshes.get(key, False) or recursive
+                )
+
+            if self._pending_refreshes_timer is not None:
+                self._pending_refreshes_timer.cancel()
+            self._pending_refreshes_timer = threading.Timer(
+                FILELIST_REFRESH_DELAY, self._flush_refreshes
+            )
+            self._pending_refreshes_timer.daemon = True
+            self._pending_refreshes_timer.start()
 
-            source_item = entry.get("source_item")
-            if source_item:
-                enqueue_refresh(source_item, target_parent=(action.endswith("_file")))
+    def _flush_refreshes(self) -> None:
+        with self._pending_refreshes_lock:
+            refreshes = self._pending_refreshes
+            self._pending_refreshes = {}
+            self._pending_refreshes_timer = None
 
-        for root, path in to_refresh:
-            self.refresh_tree(root=root, path=path, recursive=False, modified=True)
+        for (root, path), recursive in refreshes.items():
+            self.refresh_tree(root=root, path=path, recursive=recursive, modified=True)
 
     def on_gcode_response(self, _, params):
-        self._listener.on_moonraker_gcode_log(
-            *self._to_multiline_loglines("<<<", *params)
-        )
+        self._listener.on_moonraker_gcode_log(self._to_multiline_loglines("<<<", params))
 
         for line in params:
-            if line.startswith(ACTION_PREFIX):
-                action_command = line[len(ACTION_PREFIX) :].strip()
-                if " " in action_command:
-                    action_name, action_params = action_command.split(" ", 1)
-                    action_name = action_name.strip()
-                else:
-                    action_name = action_command
-                    action_params = ""
+            # the literal prefix check is cheap and rules out nearly every line
+            if not line.startswith(ACTION_PREFIX):
+                continue
 
+            match = ACTION_REGEX.match(line)
+            if match:
                 self._listener.on_moonraker_action_command(
-                    line, action_name, params=action_params
+                    line, match.group("name"), params=match.group("params") or ""
                 )
 
     ##~~ helpers
@@ -1130,6 +1527,23 @@ class MoonrakerClient(JsonRpcClient):
         self._process_update(payload)
 
     def _process_update(self, payload: dict[str, Any]) -> None:
+        # updates only carry changed fields, so merge them into what we know
+        # before anyone gets notified and might want to look at it
+        if any(payload.get(obj) for obj in self._print_status):
+            with self._print_status_lock:
+                current = self._print_status
+
+                # a new job starting invalidates whatever we know about the previous one
+                new_state = (payload.get("print_stats") or {}).get("state")
+                old_state = current["print_stats"].get("state")
+                if new_state == "printing" and old_state not in ("printing", "paused"):
+                    current = {obj: {} for obj in current}
+
+                self._print_status = {
+                    obj: {**status, **payload[obj]} if payload.get(obj) else status
+                    for obj, status in current.items()
+                }
+
         self._update_gcode_move(payload)
         self._update_idle_timeout(payload)
         self._update_print_stats(payload)
@@ -1137,25 +1551,24 @@ class MoonrakerClient(JsonRpcClient):
         self._update_virtual_sdcard(payload)
 
     def _update_temperatures(self, payload: dict[str, Any]) -> None:
+        if self._heaters.keys().isdisjoint(payload):
+            # most updates don't concern any heater at all
+            return
+
         dirty_actual = False
         dirty_target = False
 
-        for heater in self._heaters:
-            if heater not in payload:
+        for heater, name in self._heaters.items():
+            heater_data = payload.get(heater)
+            if heater_data is None:
                 continue
 
-            name = (
-                heater[len(self.GENERIC_HEATER_PREFIX) :]
-                if heater.startswith(self.GENERIC_HEATER_PREFIX)
-                else heater
-            )
-
-            data = self._current_temperatures.get(name, TemperatureDataPoint())
-            if "temperature" in payload[heater]:
-                data.actual = payload[heater]["temperature"]
+            data = self._current_temperatures.get(name, NO_TEMPERATURE)
+            if "temperature" in heater_data:
+                data = data._replace(actual=heater_data["temperature"])
                 dirty_actual = True
-            if "target" in payload[heater]:
-                data.target = payload[heater]["target"]
+            if "target" in heater_data:
+                data = data._replace(target=heater_data["target"])
                 dirty_target = True
             self._current_temperatures[name] = data
 
@@ -1166,121 +1579,144 @@ class MoonrakerClient(JsonRpcClient):
                 and self._last_temperature_update
                 and self._last_temperature_update + TEMPERATURE_INTERVAL > now
             ):
+                # throttled, but make sure the latest values still go out at the
+                # end of the interval
+                self._schedule_temperature_update(
+                    self._last_temperature_update + TEMPERATURE_INTERVAL - now
+                )
                 return
 
-            self._listener.on_moonraker_temperature_update(self._current_temperatures)
+            self._send_temperature_update()
+
+    def _schedule_temperature_update(self, delay: float) -> None:
+        with self._temperature_update_lock:
+            if self._temperature_update_timer is not None:
+                return
+
+            self._temperature_update_timer = threading.Timer(
+                delay, self._send_temperature_update
+            )
+            self._temperature_update_timer.daemon = True
+            self._temperature_update_timer.start()
+
+    def _send_temperature_update(self) -> None:
+        with self._temperature_update_lock:
+            if self._temperature_update_timer is not None:
+                self._temperature_update_timer.cancel()
+                self._temperature_update_timer = None
             self._last_temperature_update = time.monotonic()
 
+        self._listener.on_moonraker_temperature_update(dict(self._current_temperatures))
+
+    # status updates arrive several times per second, so the following read the
+    # fields they need straight from the payload instead of building models
+
     def _update_print_stats(self, payload: dict[str, Any]) -> None:
-        if "print_stats" not in payload:
+        print_stats = payload.get("print_stats")
+        if print_stats is None:
             return
 
-        print_stats = PrintStats(**payload["print_stats"])
-
-        if print_stats.state is not None:
-            printer_state = PrinterState.for_value(print_stats.state)
+        state = print_stats.get("state")
+        if state is not None:
+            printer_state = PrinterState.for_value(state)
             self._listener.on_moonraker_printer_state_changed(printer_state)
 
-        if (
-            print_stats.total_duration is not None
-            or print_stats.print_duration is not None
-        ):
+        total_duration = print_stats.get("total_duration")
+        print_duration = print_stats.get("print_duration")
+        if total_duration is not None or print_duration is not None:
             self._listener.on_moonraker_print_progress(
-                total_duration=print_stats.total_duration,
-                print_duration=print_stats.print_duration,
+                total_duration=total_duration,
+                print_duration=print_duration,
             )
 
     def _update_virtual_sdcard(self, payload: dict[str, Any]) -> None:
-        if "virtual_sdcard" not in payload:
+        sdcard_state = payload.get("virtual_sdcard")
+        if sdcard_state is None:
             return
 
-        sdcard_state = SDCardStats(**payload["virtual_sdcard"])
-
-        if sdcard_state.file_path is not None:
+        if sdcard_state.get("file_path") is not None:
             # this is the very first sd card status we see, before the print starts
             # properly - we'll ignore it for progress calculation to be able to
             # clean long running macros like heat up, leveling etc from the print
             # time estimation
             return
 
-        if sdcard_state.progress is not None or sdcard_state.file_position is not None:
+        progress = sdcard_state.get("progress")
+        file_position = sdcard_state.get("file_position")
+        if progress is not None or file_position is not None:
             self._listener.on_moonraker_print_progress(
-                progress=sdcard_state.progress, file_position=sdcard_state.file_position
+                progress=progress, file_position=file_position
             )
 
     def _update_idle_timeout(self, payload: dict[str, Any]) -> None:
-        if "idle_timeout" not in payload:
+        idle_timeout = payload.get("idle_timeout")
+        if idle_timeout is None:
             return
 
-        idle_timeout = IdleTimeout(**payload["idle_timeout"])
-
-        if idle_timeout.state is not None:
-            state = IdleState.for_value(idle_timeout.state)
-            self._listener.on_moonraker_idle_state(state)
+        state = idle_timeout.get("state")
+        if state is not None:
+            self._listener.on_moonraker_idle_state(IdleState.for_value(state))
 
     def _update_gcode_move(self, payload: dict[str, Any]) -> None:
-        if "gcode_move" not in payload:
+        gcode_move = payload.get("gcode_move")
+        if gcode_move is None:
             return
 
-        position = PositionData(**payload["gcode_move"])
-
-        if position.gcode_position is not None:
-            self._listener.on_moonraker_position_update(position.gcode_position)
+        gcode_position = gcode_move.get("gcode_position")
+        if gcode_position is not None:
+            self._listener.on_moonraker_position_update(Coordinate(*gcode_position))
 
     def _update_gcode_macros(self, payload: dict[str, Any]) -> None:
-        if "configfile" not in payload:
+        configfile = payload.get("configfile")
+        if configfile is None:
             return
 
         macro_keys = [key for key in payload if key.startswith(self.MACRO_PREFIX)]
         if not macro_keys:
             return
 
-        self._current_configfile = Configfile(**payload["configfile"])
+        source = (configfile, macro_keys)
+        if source == self._current_configfile_source:
+            # same config as last time (e.g. after a reconnect), no need to validate
+            # and parse everything again
+            self._listener.on_moonraker_macros_updated(self._current_macros)
+            return
+
+        self._current_configfile = Configfile(**configfile)
+        self._current_configfile_source = source
 
+        settings = self._current_configfile.settings
+        prefix_len = len(self.MACRO_PREFIX)
         macros = {}
 
         for key in macro_keys:
             lower_key = key.lower()
-            if lower_key not in self._current_configfile.settings:
+            if lower_key not in settings:
                 continue
 
-            macro = key[len(self.MACRO_PREFIX) :]
+            macro = key[prefix_len:]
             if macro.startswith("_"):
                 continue
 
-            gcode = self._current_configfile.settings[lower_key].get("gcode", "")
+            gcode = settings[lower_key].get("gcode", "")
             macros[macro] = extract_macro_parameters(gcode)
 
         self._current_macros = macros
         self._listener.on_moonraker_macros_updated(macros)
 
-    def _to_multiline_loglines(self, prefix, *lines) -> list[str]:
-        if len(lines) == 0:
-            return []
-        elif len(lines) == 1:
-            return [f"{prefix} {lines[0]}"]
-        else:
-            return [f"{prefix} {lines[0]}"] + [f"... {line}" for line in lines[1:]]
+    def _to_multiline_loglines(self, prefix: str, lines: list[str]) -> list[str]:
+        return [f"{prefix if i == 0 else '...'} {line}" for i, line in enumerate(lines)]
 
 
 def extract_macro_parameters(gcode: str) -> dict[str, Union[None, str, int, float, bool]]:
-    match = MACRO_PARAM_REGEX.finditer(gcode)
-    if not match:
-        return {}
-
     result = {}
-    for m in match:
+    for m in MACRO_PARAM_REGEX.finditer(gcode):
         name = m.group("name")
-        value = None
-
-        rest = gcode[m.span(0)[1] :]
-        default_match = MACRO_PARAM_DEFAULT_REGEX.match(rest)
-        if default_match:
-            value = default_match.group("value")
+        value = m.group("value")
 
-            quotechar = default_match.group("quotechar")
-            if quotechar:
-                value = value[1:-1].replace(f"\\{quotechar}", quotechar)
+        quotechar = m.group("quotechar")
+        if quotechar:
+            value = value[1:-1].replace(f"\\{quotechar}", quotechar)
 
         result[name] = value
 
@@ -1,8 +1,11 @@
 import datetime
+import functools
 import logging
 import math
 import os
-from concurrent.futures import Future
+import re
+import threading
+from concurrent.futures import Future, wait
 from email.utils import parsedate_to_datetime
 from typing import IO, TYPE_CHECKING, Any, Optional, Union, cast
 
@@ -45,6 +48,7 @@ from .client import (
     MoonrakerClientListener,
     PrinterState,
     PrintStats,
+    ResponseStream,
     SDCardStats,
     TemperatureDataPoint,
     ThumbnailInfo,
@@ -66,6 +70,48 @@ EXTENSION_TO_THUMBNAIL_MIME = {
 
 TRIGGER_TAG_FORMAT = "trigger:moonraker_connector.action_command.{action}"
 
+# heaters that can be targeted without a tool index
+HEATER_COMMANDS = {"tool": "M104", "bed": "M140", "chamber": "M141"}
+TOOL_REGEX = re.compile(r"tool(\d+)$")
+
+TAGS_JOG = frozenset({"trigger:connector.jog"})
+TAGS_HOME = frozenset({"trigger:connector.home"})
+TAGS_EXTRUDE = frozenset({"trigger:connector.extrude"})
+TAGS_CHANGE_TOOL = frozenset({"trigger:connector.change_tool"})
+TAGS_SET_TEMPERATURE = frozenset({"trigger:connector.set_temperature"})
+
+# volume of a filament cylinder in cm³ from its diameter and length in mm
+FILAMENT_VOLUME_FACTOR = math.pi / 4000.0
+
+# Moonraker requests that OctoPrint waits on synchronously
+REQUEST_TIMEOUT = 30.0
+
+# the first Z change is reported right away, further ones at most this often, so
+# that continuous z movement doesn't flood the event bus
+Z_CHANGE_INTERVAL = 0.5
+
+
+@functools.lru_cache(maxsize=1024)
+def _thumbnail_name_and_mime(relative_path: str) -> tuple[str, str]:
+    name = relative_path.rpartition("/")[2]
+    ext = relative_path.rsplit(".", maxsplit=1)[-1]
+    return name, EXTENSION_TO_THUMBNAIL_MIME.get(ext, "image/png")
+
+
+@functools.lru_cache(maxsize=256)
+def _is_machinecode(extensions: str) -> bool:
+    # evaluating this means building the full extension tree, and names with
+    # several dots make for a lot of distinct extension chains, hence bounded
+    return valid_file_type(f"x.{extensions}", type="machinecode")
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_http_date(value: str) -> Optional[datetime.datetime]:
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
 
 class ConnectedMoonrakerPrinter(
     ConnectedPrinter, PrinterFilesMixin, MoonrakerClientListener
@@ -123,18 +169,41 @@ class ConnectedMoonrakerPrinter(
             self._port = 7125
         self._apikey = kwargs.get("apikey")
 
+        # the profile is fixed for the lifetime of the connection
+        profile_axes = (self._profile or {}).get("axes", {})
+        self._axis_speeds: dict[str, int] = {
+            axis: values["speed"] for axis, values in profile_axes.items()
+        }
+        profile_extruder = (self._profile or {}).get("extruder", {})
+        extruder_count = profile_extruder.get("count", 1)
+        shared_nozzle = profile_extruder.get("sharedNozzle", False)
+        self._separate_nozzles = extruder_count > 1 and not shared_nozzle
+
         self._client = None
 
         self._state = ConnectedPrinterState.CLOSED
         self._error = None
 
         self._progress: JobProgress = None
+        self._last_notified_progress: Optional[tuple[float, int, Optional[int]]] = None
         self._job_cache: list[str] = []
         self._job_delay: float = 0.0
 
         self._printer_state: PrinterState = IdleState.UNKNOWN
         self._idle_state: IdleState = IdleState.UNKNOWN
         self._position: Coordinate = None
+        self._reported_z: Optional[float] = None
+        self._z_change_timer: Optional[threading.Timer] = None
+        self._z_change_lock = threading.Lock()
+
+        self._controls_cache: Optional[list[CustomControlContainer]] = None
+        self._printer_file_cache: dict[str, tuple[Any, ...]] = {}
+        self._printer_files: Optional[tuple[Any, tuple[PrinterFile, ...]]] = None
+        self._thumbnail_cache: dict[
+            tuple[str, Optional[str]], tuple[InternalFile, ThumbnailInfo]
+        ] = {}
+        self._readable_storages: dict[str, bool] = {}
+        self._printer_files_refreshes: dict[tuple[str, bool], Future] = {}
 
     @property
     def connection_parameters(self):
@@ -169,19 +238,31 @@ class ConnectedMoonrakerPrinter(
         MoonrakerJsonRpcLogHandler.arm_rollover()
 
         self.state = ConnectedPrinterState.CONNECTING
+        self._controls_cache = None
+        self._printer_file_cache.clear()
+        self._printer_files = None
+        self._thumbnail_cache.clear()
+        _is_machinecode.cache_clear()
+        self._readable_storages.clear()
+        self._printer_files_refreshes.clear()
         self._client = MoonrakerClient(
             self, self._host, port=self._port, apikey=self._apikey
         )
         self._client.connect()
 
     def disconnect(self, *args, **kwargs):
+        with self._z_change_lock:
+            if self._z_change_timer is not None:
+                self._z_change_timer.cancel()
+                self._z_change_timer = None
+
         if self._client is None:
             return
         self._event_bus.fire(Events.DISCONNECTING)
         self._client.disconnect()
 
     def emergency_stop(self, *args, **kwargs):
-        self.commands("M112", tags=kwargs.get("tags", set()))
+        self.commands("M112", tags=kwargs.get("tags", frozenset()))
 
     def get_error(self, *args, **kwargs):
         return self._error
@@ -189,51 +270,64 @@ class ConnectedMoonrakerPrinter(
     def get_additional_controls(
         self,
     ) -> list[Union[CustomControl, CustomControlContainer]]:
+        # macros only change on on_moonraker_macros_updated, which resets the cache
+        if self._controls_cache is not None:
+            return self._controls_cache
+
         controls = [
             self._to_custom_control(macro, data)
             for macro, data in self._client.current_macros.items()
         ]
         controls.sort(key=lambda x: x.name.lower())
 
-        return [
+        self._controls_cache = [
             CustomControlContainer(
                 name=f"Printer Macros ({len(controls)})",
                 children=controls,
                 collapsed=True,
             )
         ]
+        return self._controls_cache
 
     def jog(self, axes, relative=True, speed=None, *args, **kwargs):
-        command = "G0 {}".format(
-            " ".join([f"{axis.upper()}{amt}" for axis, amt in axes.items()])
-        )
+        if self._client is None:
+            return
+
+        parts = ["G0"]
+        parts.extend([f"{axis.upper()}{amt}" for axis, amt in axes.items()])
 
         if speed is None:
-            speed = min(self._profile["axes"][axis]["speed"] for axis in axes)
+            speed = min(self._axis_speeds[axis] for axis in axes)
 
         if speed and not isinstance(speed, bool):
-            command += f" F{speed}"
+            parts.append(f"F{speed}")
+
+        command = " ".join(parts)
 
         if relative:
-            commands = ["G91", command, "G90"]
+            commands = ("G91", command, "G90")
         else:
-            commands = ["G90", command]
+            commands = ("G90", command)
 
-        self.commands(
-            *commands, tags=kwargs.get("tags", set()) | {"trigger:connector.jog"}
-        )
+        self.commands(*commands, tags=kwargs.get("tags", frozenset()) | TAGS_JOG)
 
     def home(self, axes, *args, **kwargs):
+        if self._client is None:
+            return
+
         self.commands(
             "G91",
-            "G28 {}".format(" ".join(f"{x.upper()}0" for x in axes)),
+            "G28 " + " ".join([f"{axis.upper()}0" for axis in axes]),
             "G90",
-            tags=kwargs.get("tags", set) | {"trigger:connector.home"},
+            tags=kwargs.get("tags", frozenset()) | TAGS_HOME,
         )
 
     def extrude(self, amount, speed=None, *args, **kwargs):
+        if self._client is None:
+            return
+
         # Use specified speed (if any)
-        max_e_speed = self._profile["axes"]["e"]["speed"]
+        max_e_speed = self._axis_speeds["e"]
 
         if speed is None:
             # No speed was specified so default to value configured in printer profile
@@ -248,40 +342,45 @@ class ConnectedMoonrakerPrinter(
             f"G1 E{amount} F{extrusion_speed}",
             "M82",
             "G90",
-            tags=kwargs.get("tags", set()) | {"trigger:connector.extrude"},
+            tags=kwargs.get("tags", frozenset()) | TAGS_EXTRUDE,
         )
 
     def change_tool(self, tool, *args, **kwargs):
-        tool = int(tool[len("tool") :])
+        if self._client is None:
+            return
+
+        match = TOOL_REGEX.match(tool)
+        if not match:
+            raise ValueError(f"Invalid tool: {tool!r}")
+
         self.commands(
-            f"T{tool}",
-            tags=kwargs.get("tags", set()) | {"trigger:connector.change_tool"},
+            f"T{int(match.group(1))}",
+            tags=kwargs.get("tags", frozenset()) | TAGS_CHANGE_TOOL,
         )
 
     def set_temperature(self, heater, value, tags=None, *args, **kwargs):
-        if not tags:
-            tags = set()
-        tags |= {"trigger:connector.set_temperature"}
+        if self._client is None:
+            return
+
+        tags = (tags or frozenset()) | TAGS_SET_TEMPERATURE
 
-        if heater == "tool":
-            # set current tool, whatever that might be
-            self.commands(f"M104 S{value}", tags=tags)
+        # "tool" sets the current tool, whatever that might be
+        command = HEATER_COMMANDS.get(heater)
+        if command is None:
+            match = TOOL_REGEX.match(heater)
+            if not match:
+                if heater.startswith("tool"):
+                    raise ValueError(f"Invalid tool: {heater!r}")
+                self._logger.warning(f"Ignoring temperature for unknown heater {heater}")
+                return
 
-        elif heater.startswith("tool"):
             # set specific tool
-            extruder_count = self._profile["extruder"]["count"]
-            shared_nozzle = self._profile["extruder"]["sharedNozzle"]
-            if extruder_count > 1 and not shared_nozzle:
-                toolNum = int(heater[len("tool") :])
-                self.commands(f"M104 T{toolNum} S{value}", tags=tags)
+            if self._separate_nozzles:
+                command = f"M104 T{int(match.group(1))}"
             else:
-                self.commands(f"M104 S{value}", tags=tags)
+                command = "M104"
 
-        elif heater == "bed":
-            self.commands(f"M140 S{value}", tags=tags)
-
-        elif heater == "chamber":
-            self.commands(f"M141 S{value}", tags=tags)
+        self.commands(f"{command} S{value}", tags=tags)
 
     def commands(self, *commands, tags=None, force=False, **kwargs):
         if self._client is None:
@@ -290,21 +389,26 @@ class ConnectedMoonrakerPrinter(
         self._client.send_gcode_commands(*commands)
 
     def is_ready(self, *args, **kwargs):
+        client = self._client
         return (
-            super().is_ready(*args, **kwargs)
-            and self._client.klipper_state == KlipperState.READY
+            client is not None
+            and client.klipper_state is KlipperState.READY
+            and super().is_ready(*args, **kwargs)
         )
 
     ##~~ Job handling
 
     def supports_job(self, job: PrintJob) -> bool:
-        if not valid_file_type(job.path, type="machinecode"):
+        name = job.path.rpartition("/")[2]
+        if "." not in name:
             return False
 
-        if (
-            job.storage != FileDestinations.PRINTER
-            and not self._file_manager.capabilities(job.storage).read_file
-        ):
+        # validity only depends on the extensions
+        extensions = name.split(".", maxsplit=1)[1].lower()
+        if not _is_machinecode(extensions):
+            return False
+
+        if job.storage != FileDestinations.PRINTER and not self._can_read(job.storage):
             return False
 
         return True
@@ -318,71 +422,105 @@ class ConnectedMoonrakerPrinter(
             job=self.current_job, progress=0.0, pos=pos, elapsed=0.0, cleaned_elapsed=0.0
         )
         self._job_delay = 0.0
+        self._last_notified_progress = None
 
         try:
             if self.current_job.storage == FileDestinations.PRINTER:
-                self._client.start_print(self.current_job.path).result()
+                self._client.start_print(self.current_job.path).result(
+                    timeout=REQUEST_TIMEOUT
+                )
 
             else:
                 # we first need to upload this as a cache file, then start the print on that
 
                 if self._job_cache:
                     # if we still have a job cache file, delete it now
-                    for f in self._job_cache:
-                        self._client.delete_file(f)
+                    # wait for the batch, the new upload might reuse the same path;
+                    # failed deletes are logged by the client and can be ignored
+                    wait(
+                        self._client.delete_files(self._job_cache),
+                        timeout=REQUEST_TIMEOUT,
+                    )
                     self._job_cache = []
 
                 _, filename = self._file_manager.split_path(
                     self.current_job.storage, self.current_job.path
                 )
                 job_cache = f".octoprint/{filename}"
-                print_future = Future()
+                job = self.current_job
 
+                # the upload runs in the background, don't block the caller until it
+                # is done, the state changes will tell when printing actually starts
                 def handle_uploaded(future: Future) -> None:
                     try:
                         future.result()
+                        self._client.start_print(job_cache).result(
+                            timeout=REQUEST_TIMEOUT
+                        )
+                    except Exception:
+                        self._on_start_print_failed(job)
 
-                        self._client.start_print(job_cache).result()
-
-                        print_future.set_result(True)
-
-                    except Exception as exc:
-                        print_future.set_exception(exc)
-
-                handle = self._file_manager.read_file(
-                    self.current_job.storage, self.current_job.path
-                )
+                handle = self._file_manager.read_file(job.storage, job.path)
                 self._client.upload_file(handle, job_cache).add_done_callback(
                     handle_uploaded
                 )
-                print_future.result()
 
         except Exception:
-            self._logger.exception(
-                f"Error while starting print job of {self.current_job.storage}:{self.current_job.path}"
-            )
-            self._listener.on_printer_job_cancelled()
-            self.state = ConnectedPrinterState.OPERATIONAL
+            self._on_start_print_failed(self.current_job)
+
+    def _on_start_print_failed(self, job: PrintJob) -> None:
+        self._logger.exception(
+            f"Error while starting print job of {job.storage}:{job.path}"
+        )
+        self._listener.on_printer_job_cancelled()
+        self.state = ConnectedPrinterState.OPERATIONAL
+
+    # job control doesn't wait for Moonraker, the state is set right away and the
+    # status updates take it from there, or it is reverted should the call fail
 
     def pause_print(self, tags=None, *args, **kwargs):
+        previous = self.state
         self.state = ConnectedPrinterState.PAUSING
-        self._client.pause_print().result()
+        self._revert_state_on_error(self._client.pause_print(), "pause", previous)
 
     def resume_print(self, tags=None, *args, **kwargs):
+        previous = self.state
         self.state = ConnectedPrinterState.RESUMING
-        self._client.resume_print().result()
+        self._revert_state_on_error(self._client.resume_print(), "resume", previous)
 
     def cancel_print(self, tags=None, *args, **kwargs):
         if self.state == ConnectedPrinterState.CANCELLING:
             # we are already cancelling
             return
 
+        previous = self.state
         self.state = ConnectedPrinterState.CANCELLING
         if self._plugin_settings.get_boolean(["emergency_stop_on_cancel"]):
-            self._client.trigger_emergency_stop().result()
-            self._client.send_gcode_commands("FIRMWARE_RESTART")
+            future = self._client.trigger_emergency_stop()
+
+            def on_stopped(f: Future) -> None:
+                if not f.exception():
+                    self._client.send_gcode_commands("FIRMWARE_RESTART")
+
+            future.add_done_callback(on_stopped)
         else:
-            self._client.cancel_print().result()
+            future = self._client.cancel_print()
+        self._revert_state_on_error(future, "cancel", previous)
+
+    def _revert_state_on_error(
+        self, future: Future, action: str, previous: ConnectedPrinterState
+    ) -> None:
+        expected = self.state
+
+        def on_done(f: Future) -> None:
+            try:
+                f.result()
+            except Exception:
+                self._logger.exception(f"Error while trying to {action} the print job")
+                if self.state == expected:
+                    self.state = previous
+
+        future.add_done_callback(on_done)
 
     ##~~ PrinterFilesMixin
 
@@ -393,7 +531,14 @@ class ConnectedMoonrakerPrinter(
     def refresh_printer_files(
         self, path="", recursive=False, blocking=False, timeout=10, *args, **kwargs
     ) -> None:
-        future = self._client.refresh_tree(path=path, recursive=recursive)
+        key = (path, recursive)
+
+        # piggyback on a refresh of the same folder that is still running
+        future = self._printer_files_refreshes.get(key)
+        if future is None or future.done():
+            future = self._client.refresh_tree(path=path, recursive=recursive)
+            self._printer_files_refreshes[key] = future
+
         if blocking:
             future.result(timeout=timeout)
 
@@ -404,32 +549,31 @@ class ConnectedMoonrakerPrinter(
         if refresh:
             self.refresh_printer_files(recursive=recursive, blocking=True)
 
-        result = []
-        for contents in list(self._client.current_tree.values()):
-            children = [self._to_printer_file(f) for f in list(contents.values())]
-            result.extend(children)
-        return result
+        # the listing only changes with tree updates, which reset it, and with the
+        # job history, which is part of the file metadata. After a refresh the reset
+        # might not have happened yet though, so the listing is always rebuilt then
+        history = self._client.job_history
+        cached = self._printer_files
+        if not refresh and cached is not None and cached[0] is history:
+            return list(cached[1])
+
+        files = tuple(
+            self._to_printer_file(f)
+            for contents in list(self._client.current_tree.values())
+            for f in list(contents.values())
+        )
+        self._printer_files = (history, files)
+        return list(files)
 
     def _get_internal_file(self, path: str, refresh=False) -> Optional[InternalFile]:
         if not self.printer_files_mounted:
             return None
 
-        if "/" in path:
-            parent, name = path.rsplit("/", 1)
-        else:
-            parent = ""
-            name = path
-
         if refresh:
+            parent = path.rpartition("/")[0]
             self.refresh_printer_files(path=parent, blocking=True)
 
-        if (
-            parent in self._client.current_tree
-            and name in self._client.current_tree[parent]
-        ):
-            return self._client.current_tree[parent][name]
-
-        return None
+        return self._client.current_files.get(path)
 
     def get_printer_file(self, path: str, refresh=False, *args, **kwargs):
         internal = self._get_internal_file(path, refresh=refresh)
@@ -438,20 +582,26 @@ class ConnectedMoonrakerPrinter(
         return self._to_printer_file(internal)
 
     def create_printer_folder(self, target: str, *args, **kwargs) -> str:
-        self._client.create_folder(target).result()
+        self._client.create_folder(target).result(timeout=REQUEST_TIMEOUT)
+        self._printer_files_changed()
         return target
 
     def delete_printer_folder(
         self, target: str, recursive: bool = False, *args, **kwargs
     ) -> None:
-        self._client.delete_folder(target, force=recursive).result()
+        self._client.delete_folder(target, force=recursive).result(
+            timeout=REQUEST_TIMEOUT
+        )
+        self._printer_files_changed()
 
     def copy_printer_folder(self, source, target, *args, **kwargs) -> str:
-        self._client.copy_path(source, target).result()
+        self._client.copy_path(source, target).result(timeout=REQUEST_TIMEOUT)
+        self._printer_files_changed()
         return target
 
     def move_printer_folder(self, source, target, *args, **kwargs) -> str:
-        self._client.move_path(source, target).result()
+        self._client.move_path(source, target).result(timeout=REQUEST_TIMEOUT)
+        self._printer_files_changed()
         return target
 
     def upload_printer_file(
@@ -459,6 +609,7 @@ class ConnectedMoonrakerPrinter(
     ) -> str:
         try:
             self._client.upload_file(source, target).result()
+            self._printer_files_changed()
             if callable(progress_callback):
                 progress_callback(done=True)
         except Exception:
@@ -472,14 +623,17 @@ class ConnectedMoonrakerPrinter(
         return self._client.download_file(path).raw
 
     def delete_printer_file(self, path, *args, **kwargs) -> None:
-        self._client.delete_file(path).result()
+        self._client.delete_file(path).result(timeout=REQUEST_TIMEOUT)
+        self._printer_files_changed()
 
     def copy_printer_file(self, source, target, *args, **kwargs) -> str:
-        self._client.copy_path(source, target).result()
+        self._client.copy_path(source, target).result(timeout=REQUEST_TIMEOUT)
+        self._printer_files_changed()
         return target
 
     def move_printer_file(self, source, target, *args, **kwargs) -> str:
-        self._client.move_path(source, target).result()
+        self._client.move_path(source, target).result(timeout=REQUEST_TIMEOUT)
+        self._printer_files_changed()
         return target
 
     def get_printer_file_metadata(self, path, *args, **kwargs) -> MetadataEntry:
@@ -487,6 +641,10 @@ class ConnectedMoonrakerPrinter(
         if not internal:
             return None
 
+        if internal.filename != ".":
+            # reuse the metadata of the memoized printer file
+            return self._to_printer_file(internal).metadata
+
         return self._get_metadata_entry_for_file(internal)
 
     def has_thumbnail(self, path, *args, refresh=False, **kwargs):
@@ -496,36 +654,41 @@ class ConnectedMoonrakerPrinter(
     def get_thumbnail(
         self, path, sizehint=None, *args, **kwargs
     ) -> Optional[StorageThumbnail]:
-        thumbnail = self._thumbnail_for_sizehint(path, sizehint=sizehint)
-        if not thumbnail:
+        found = self._thumbnail_for_sizehint(path, sizehint=sizehint)
+        if not found:
             return None
 
-        return self._to_storage_thumbnail(thumbnail, path)
+        return self._to_storage_thumbnail(found[1], path)
 
     def download_thumbnail(self, path, sizehint=None, *args, **kwargs) -> Optional[IO]:
-        thumbnail = self._thumbnail_for_sizehint(path, sizehint=sizehint)
-        if not thumbnail:
+        found = self._thumbnail_for_sizehint(path, sizehint=sizehint)
+        if not found:
             return None
 
+        internal, thumbnail = found
         meta = self._to_storage_thumbnail(thumbnail, path)
 
         thumb_path = thumbnail.relative_path
 
-        if "/" in path:
-            folder = path.rsplit("/", maxsplit=1)[0]
+        if "/" in internal.path:
+            folder = internal.path.rsplit("/", maxsplit=1)[0]
             response = self._client.download_file(f"{folder}/{thumb_path}")
         else:
             response = self._client.download_file(thumb_path)
 
-        if "Content-Type" in response.headers:
-            meta.mime = response.headers.get("Content-Type")
-        if "Content-Length" in response.headers:
-            meta.size = int(response.headers.get("Content-Length"))
-        if "Last-Modified" in response.headers:
-            lm = parsedate_to_datetime(response.headers.get("Last-Modified"))
-            meta.last_modified = lm
+        headers = response.headers
+        if "Content-Type" in headers:
+            meta.mime = headers.get("Content-Type")
+        if (
+            "Content-Length" in headers
+            and headers.get("Content-Encoding", "identity") == "identity"
+        ):
+            # only the length of an unencoded body matches what we hand out
+            meta.size = int(headers.get("Content-Length"))
+        if "Last-Modified" in headers:
+            meta.last_modified = _parse_http_date(headers.get("Last-Modified"))
 
-        return meta, response.raw
+        return meta, ResponseStream(response)
 
     def refresh_thumbnails(
         self, path: str, force: bool = False, recursive: bool = False
@@ -540,34 +703,42 @@ class ConnectedMoonrakerPrinter(
     def _to_storage_thumbnail(
         self, thumbnail: ThumbnailInfo, printable: str
     ) -> StorageThumbnail:
-        name = thumbnail.relative_path
-        if "/" in name:
-            name = name.rsplit("/", maxsplit=1)[1]
-
-        ext = thumbnail.relative_path.rsplit(".", maxsplit=1)[1]
+        name, mime = _thumbnail_name_and_mime(thumbnail.relative_path)
 
         return StorageThumbnail(
             name=name,
             printable=printable,
             sizehint=f"{thumbnail.width}x{thumbnail.height}",
-            mime=EXTENSION_TO_THUMBNAIL_MIME.get(ext, "image/png"),
+            mime=mime,
             size=thumbnail.size,
         )
 
-    def _thumbnail_for_sizehint(self, path, sizehint=None) -> Optional[ThumbnailInfo]:
+    def _thumbnail_for_sizehint(
+        self, path, sizehint=None
+    ) -> Optional[tuple[InternalFile, ThumbnailInfo]]:
         internal = self._get_internal_file(path)
         if not internal or not internal.thumbnails:
             return None
 
-        sorted_thumbnails = sorted(
-            internal.thumbnails, key=lambda x: x.width * x.height, reverse=True
-        )
+        # InternalFile instances are only replaced when the file changes, so they
+        # double as the cache validator here
+        cached = self._thumbnail_cache.get((path, sizehint))
+        if cached is not None and cached[0] is internal:
+            return cached
+
+        cached = (internal, self._select_thumbnail(internal, sizehint))
+        self._thumbnail_cache[(path, sizehint)] = cached
+        return cached
+
+    def _select_thumbnail(
+        self, internal: InternalFile, sizehint: Optional[str]
+    ) -> ThumbnailInfo:
         if sizehint:
             w, h = map(int, sizehint.split("x"))
-            for t in sorted_thumbnails:
+            for t in internal.thumbnails:
                 if t.width == w and t.height == h:
                     return t
-        return sorted_thumbnails[0]
+        return max(internal.thumbnails, key=lambda x: x.width * x.height)
 
     def get_usage_information(self) -> Optional[PrinterFilesUsage]:
         usage = self._client.current_usage
@@ -612,14 +783,17 @@ class ConnectedMoonrakerPrinter(
     def on_moonraker_temperature_update(
         self, data: dict[str, TemperatureDataPoint]
     ) -> None:
+        # heaters OctoPrint doesn't know about are left out
+        lookup = self.TEMPERATURE_LOOKUP.get
         self._listener.on_printer_temperature_update(
             {
-                self.TEMPERATURE_LOOKUP.get(key): (value.actual, value.target)
+                name: (value.actual, value.target)
                 for key, value in data.items()
+                if (name := lookup(key)) is not None
             }
         )
 
-    def on_moonraker_gcode_log(self, *lines: str) -> None:
+    def on_moonraker_gcode_log(self, lines: list[str]) -> None:
         self._listener.on_printer_logs(*lines)
 
     def on_moonraker_file_tree_updated(
@@ -628,19 +802,26 @@ class ConnectedMoonrakerPrinter(
         if root != "gcodes":
             return
 
-        paths = [
-            p
-            for p in self._client.current_tree
-            if p == ".octoprint" or p.startswith(".octoprint/")
-        ]
-        job_cache = []
-        for p in paths:
-            job_cache.extend([f.path for f in self._client.current_tree[p].values()])
-        self._job_cache = job_cache
+        if path == "" or path == ".octoprint" or path.startswith(".octoprint/"):
+            # only the root or the job cache folder itself can change the job cache
+            self._job_cache = [
+                f.path
+                for p, contents in list(self._client.current_tree.items())
+                if p == ".octoprint" or p.startswith(".octoprint/")
+                for f in list(contents.values())
+            ]
+
+        self._printer_files = None
+        for p in self._printer_file_cache.keys() - self._client.current_files.keys():
+            self._printer_file_cache.pop(p, None)
+        for key, (internal, _) in list(self._thumbnail_cache.items()):
+            if self._client.current_files.get(key[0]) is not internal:
+                self._thumbnail_cache.pop(key, None)
 
         self._listener.on_printer_files_refreshed(self.get_printer_files(refresh=False))
 
     def on_moonraker_macros_updated(self, macros):
+        self._controls_cache = None
         self._listener.on_printer_controls_updated(self.get_additional_controls())
 
     def on_moonraker_printer_state_changed(self, state: PrinterState) -> None:
@@ -681,7 +862,14 @@ class ConnectedMoonrakerPrinter(
 
                     self.state = ConnectedPrinterState.PRINTING
 
-                self._client.query_print_status().add_done_callback(on_status)
+                # the subscription usually told us already, only ask if it didn't
+                cached = self._client.cached_print_status()
+                if cached is not None:
+                    status = Future()
+                    status.set_result(cached)
+                    on_status(status)
+                else:
+                    self._client.query_print_status().add_done_callback(on_status)
 
             elif self.state != ConnectedPrinterState.PRINTING:
                 if self.state in (
@@ -724,6 +912,7 @@ class ConnectedMoonrakerPrinter(
                 cleaned_elapsed=0.0,
             )
             self._job_delay = 0.0
+            self._last_notified_progress = None
 
         if self._progress is None:
             return
@@ -754,6 +943,21 @@ class ConnectedMoonrakerPrinter(
             dirty = True
 
         if dirty:
+            self._notify_progress()
+
+    def _notify_progress(self):
+        progress = self._progress
+
+        # only notify on changes that are actually visible, the file position is
+        # not displayed anywhere and changes with every line
+        left = progress.left_estimate
+        notified = (
+            round(progress.progress or 0.0, 3),
+            int(progress.elapsed or 0),
+            int(left) if left is not None else None,
+        )
+        if notified != self._last_notified_progress:
+            self._last_notified_progress = notified
             self._listener.on_printer_job_progress()
 
     def on_moonraker_idle_state(self, state: IdleState):
@@ -821,12 +1025,70 @@ class ConnectedMoonrakerPrinter(
 
     def on_moonraker_position_update(self, position: Coordinate):
         prev = self._position
-        if prev and prev.z != position.z:
-            self._event_bus.fire(Events.Z_CHANGE, {"new": position.z, "old": prev.z})
         self._position = position
 
+        if prev is None:
+            self._reported_z = position.z
+            return
+        if prev.z == position.z:
+            return
+
+        with self._z_change_lock:
+            if self._z_change_timer is not None:
+                # throttled, the timer will report the latest z
+                return
+            change = self._take_z_change(fallback=prev.z)
+            self._start_z_change_timer()
+
+        if change:
+            self._fire_z_change(*change)
+
+    def _report_z_change(self):
+        with self._z_change_lock:
+            self._z_change_timer = None
+            change = self._take_z_change()
+            if change:
+                # z is still moving, keep throttling
+                self._start_z_change_timer()
+
+        if change:
+            self._fire_z_change(*change)
+
+    def _take_z_change(
+        self, fallback: Optional[float] = None
+    ) -> Optional[tuple[float, float]]:
+        # caller holds the z change lock
+        old = self._reported_z if self._reported_z is not None else fallback
+        new = self._position.z if self._position else None
+        if old is None or new is None or old == new:
+            return None
+
+        self._reported_z = new
+        return old, new
+
+    def _start_z_change_timer(self):
+        # caller holds the z change lock
+        self._z_change_timer = threading.Timer(Z_CHANGE_INTERVAL, self._report_z_change)
+        self._z_change_timer.daemon = True
+        self._z_change_timer.start()
+
+    def _fire_z_change(self, old: float, new: float):
+        self._event_bus.fire(Events.Z_CHANGE, {"new": new, "old": old})
+
     ##~~ helpers
 
+    def _can_read(self, storage: str) -> bool:
+        readable = self._readable_storages.get(storage)
+        if readable is None:
+            readable = self._file_manager.capabilities(storage).read_file
+            self._readable_storages[storage] = readable
+        return readable
+
+    def _printer_files_changed(self) -> None:
+        # refreshes still running were started before the change, don't let later
+        # refreshes piggyback on those
+        self._printer_files_refreshes.clear()
+
     def _evaluate_actual_status(self):
         if self.state in (
             ConnectedPrinterState.STARTING,
@@ -887,8 +1149,9 @@ class ConnectedMoonrakerPrinter(
 
         filament_analysis = {}
         if filament_length and nozzle_dia:
-            radius = nozzle_dia / 2.0
-            filament_volume = math.pi * radius * radius * filament_length / 1000.0
+            filament_volume = (
+                FILAMENT_VOLUME_FACTOR * nozzle_dia * nozzle_dia * filament_length
+            )
             filament_analysis = {
                 "tool0": AnalysisFilamentUse(
                     length=filament_length, volume=filament_volume
@@ -920,19 +1183,43 @@ class ConnectedMoonrakerPrinter(
         ]
 
     def _to_printer_file(self, internal: InternalFile) -> PrinterFile:
+        # the client reuses unchanged InternalFile instances across refreshes, but
+        # folder entries get their size & date updated in place and the metadata
+        # depends on the job history, so all of that needs to match as well
+        history = self._client.job_history
+        cached = self._printer_file_cache.get(internal.path)
+        if cached is not None:
+            c_internal, c_modified, c_size, c_history, printer_file = cached
+            if (
+                c_internal is internal
+                and c_modified == internal.modified
+                and c_size == internal.size
+                and c_history is history
+            ):
+                return printer_file
+
+        printer_file = self._create_printer_file(internal)
+        self._printer_file_cache[internal.path] = (
+            internal,
+            internal.modified,
+            internal.size,
+            history,
+            printer_file,
+        )
+        return printer_file
+
+    def _create_printer_file(self, internal: InternalFile) -> PrinterFile:
         if internal.filename == ".":
             # folder metadata
             path = internal.path[:-1]
             return PrinterFile(
                 path=path,
-                display=path.rsplit("/")[-2] if "/" in path else path,
+                display=path[:-1].rpartition("/")[2],
                 size=internal.size,
                 date=datetime.datetime.fromtimestamp(internal.modified, tz=UTC_TZ),
             )
 
-        display = internal.path
-        if "/" in internal.path:
-            _, display = internal.path.rsplit("/", 1)
+        display = internal.path.rpartition("/")[2]
 
         thumbnails = []
         if internal.thumbnails:
@@ -949,18 +1236,17 @@ class ConnectedMoonrakerPrinter(
 
     def _to_custom_control(self, macro: str, data: dict[str, Any]) -> CustomControl:
         if data:
-            inputs = [
-                CustomControlInput(
-                    name=name, parameter=name, default=value if value is not None else ""
+            inputs = []
+            parts = [macro]
+            for name, value in data.items():
+                inputs.append(
+                    CustomControlInput(
+                        name=name,
+                        parameter=name,
+                        default=value if value is not None else "",
+                    )
                 )
-                for name, value in data.items()
-            ]
-            return CustomControl(
-                name=macro,
-                command=macro
-                + " "
-                + " ".join([f"{input.name}={{{input.name}}}" for input in inputs]),
-                input=inputs,
-            )
+                parts.append(f"{name}={{{name}}}")
+            return CustomControl(name=macro, command=" ".join(parts), input=inputs)
         else:
             return CustomControl(name=macro, command=macro)
@@ -1,9 +1,9 @@
+import itertools
 import json
 import logging
 import threading
-from collections import defaultdict
 from concurrent.futures import Future, ThreadPoolExecutor
-from typing import Any
+from typing import Any, Optional
 
 import websocket
 
@@ -89,6 +89,7 @@ class JsonRpcClient(websocket.WebSocketApp):
         self._workers = workers
 
         self._thread = None
+        self._dispatch_executor = None
         self._response_executor = None
 
         logger_name = "octoprint.plugins.moonraker_connector.jsonrpc"
@@ -98,11 +99,14 @@ class JsonRpcClient(websocket.WebSocketApp):
         self._connect_future = None
         self._closing = False
 
-        self._subscribers = defaultdict(list)
+        # notification -> tuple of callbacks, replaced rather than mutated so the
+        # dispatch worker can iterate it without locking
+        self._subscribers: dict[str, tuple] = {}
+        self._subscribers_lock = threading.Lock()
         self._calls: dict[int, tuple[str, dict[str, Any], Future]] = {}
 
-        self._msgid_lock = threading.RLock()
-        self._msgid_counter = 0
+        # next() on itertools.count is atomic in CPython, no lock needed
+        self._msgid_counter = itertools.count(1)
 
         super().__init__(
             url=url,
@@ -113,9 +117,12 @@ class JsonRpcClient(websocket.WebSocketApp):
         )
 
     def connect(self) -> Future:
-        self._dual_log(logging.INFO, f"Connecting to {self.url}...")
+        self._dual_log(logging.INFO, "Connecting to %s...", self.url)
         self._connect_future = Future()
 
+        self._dispatch_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="JSON RPC Dispatch Worker "
+        )
         self._response_executor = ThreadPoolExecutor(
             max_workers=self._workers, thread_name_prefix="JSON RPC Connection Worker "
         )
@@ -146,10 +153,14 @@ class JsonRpcClient(websocket.WebSocketApp):
     def disconnect(self):
         self._dual_log(logging.INFO, "Disconnecting...")
 
+        # frames still arriving from here on get dropped in on_message
+        self._closing = True
+
+        self._dispatch_executor.shutdown(cancel_futures=True)
+        self._dispatch_executor = None
         self._response_executor.shutdown(cancel_futures=True)
         self._response_executor = None
 
-        self._closing = True
         self.close()
 
     def on_open(self, cls):
@@ -157,26 +168,43 @@ class JsonRpcClient(websocket.WebSocketApp):
         self._connect_future.set_result(True)
 
     def on_message(self, cls, message, *args, **kwargs):
-        payload = json.loads(message)
+        # Ordering guarantees: notifications are handled one after the other on a
+        # single worker, in the order they arrived. Responses are resolved on their
+        # own workers as soon as they arrive, so that notification handlers can
+        # wait on calls. A call's future may therefore complete before notifications
+        # that were received ahead of its response have been handled.
+        #
+        # Decoding happens right here on the connection thread, so that responses
+        # never end up queued behind a notification handler that is waiting for them.
+        if self._closing:
+            return
+
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            self._logger.exception("Received invalid JSON, ignoring")
+            return
+
         if isinstance(payload, list):
             for p in payload:
-                self._response_executor.submit(self._process_message, p)
+                self._process_message(p)
         elif isinstance(payload, dict):
-            self._response_executor.submit(self._process_message, payload)
+            self._process_message(payload)
 
     def _process_message(self, message: dict):
         if message.get("jsonrpc") != self.JSONRPC_VERSION:
             return
 
-        if "result" in message or "error" in message:
-            self._process_response(message)
-
-        elif "method" in message:
-            method = message["method"]
-
+        # notifications make up most of the traffic, so check for those first
+        method = message.get("method")
+        if method is not None:
             if method.startswith("notify_"):
+                # notifications are handled on a single worker, to preserve the
+                # order in which they arrive
                 params = message.get("params")
-                self._process_notification(method, params)
+                self._submit(
+                    self._dispatch_executor, self._process_notification, method, params
+                )
 
             else:
                 self.send_error(
@@ -184,6 +212,21 @@ class JsonRpcClient(websocket.WebSocketApp):
                     msgid=message.get("id"),
                 )
 
+        elif "result" in message or "error" in message:
+            # resolving a call runs its done callbacks, don't hold up the connection
+            # thread or the notification worker with those
+            self._submit(self._response_executor, self._process_response, message)
+
+    def _submit(self, executor: Optional[ThreadPoolExecutor], fn, *args) -> None:
+        # the executors go away on disconnect, possibly while a frame is processed
+        if executor is None:
+            return
+        try:
+            executor.submit(fn, *args)
+        except RuntimeError:
+            # shut down in the meantime
+            pass
+
     def _process_response(self, response: dict):
         msgid = response.get("id")
         if msgid not in self._calls:
@@ -195,7 +238,7 @@ class JsonRpcClient(websocket.WebSocketApp):
             result = response["result"]
             future.set_result(result)
             self._dual_log(
-                logging.DEBUG, f"Received result for {method} (id {msgid}): {result!r}"
+                logging.DEBUG, "Received result for %s (id %s): %r", method, msgid, result
             )
 
         elif "error" in response:
@@ -210,30 +253,44 @@ class JsonRpcClient(websocket.WebSocketApp):
             exc = JsonRpcError.for_error(code, message, data=data)
             self._dual_log(
                 logging.ERROR,
-                f"Received error for {method} (id {msgid}): {error!r}",
+                "Received error for %s (id %s): %r",
+                method,
+                msgid,
+                error,
                 exc_info=exc,
             )
             future.set_exception(exc)
 
     def _process_notification(self, method, params):
-        if method in self._subscribers:
-            self._console_logger.debug(f"Received notification for {method}: {params!r}")
+        subscribers = self._subscribers.get(method)
+        if not subscribers:
+            return
 
-        for sub in self._subscribers.get(method, []):
+        self._console_logger.debug("Received notification for %s: %r", method, params)
+        for sub in subscribers:
             sub(method, params)
 
     def on_error(self, cls, exc: Exception):
-        self._dual_log(logging.ERROR, f"Error: {exc!s}", exc_info=exc)
+        self._dual_log(logging.ERROR, "Error: %s", exc, exc_info=exc)
 
     def on_close(self, cls, code: int, reason: str):
-        self._dual_log(logging.INFO, f"Connection closed: code={code}, reason={reason}")
+        self._dual_log(
+            logging.INFO, "Connection closed: code=%s, reason=%s", code, reason
+        )
 
-    def call_method(
-        self, method: str, params=None, timeout=None, *args, **kwargs
-    ) -> Future:
-        if timeout is None:
-            timeout = self._timeout
+    def call_method(self, method: str, params=None, *args, **kwargs) -> Future:
+        payload, future = self._prepare_call(method, params=params)
+        self.send_text(json.dumps(payload))
+        return future
 
+    def call_batch(self, calls: list[tuple[str, Any]]) -> list[Future]:
+        # calls is a list of (method, params), sent as a single JSON-RPC batch
+        prepared = [self._prepare_call(method, params=params) for method, params in calls]
+        if prepared:
+            self.send_text(json.dumps([payload for payload, _ in prepared]))
+        return [future for _, future in prepared]
+
+    def _prepare_call(self, method: str, params=None) -> tuple[dict[str, Any], Future]:
         msgid = self._generate_msgid()
 
         payload = {"jsonrpc": self.JSONRPC_VERSION, "method": method, "id": msgid}
@@ -241,25 +298,19 @@ class JsonRpcClient(websocket.WebSocketApp):
             payload["params"] = params
 
         self._dual_log(
-            logging.DEBUG, f"Calling method {method} (id {msgid}), params: {params!r}"
+            logging.DEBUG,
+            "Calling method %s (id %s), params: %r",
+            method,
+            msgid,
+            params,
         )
 
-        def on_done(f: Future) -> None:
-            try:
-                f.result(timeout=timeout)
-            except Exception as exc:
-                self._dual_log(
-                    logging.DEBUG, f"Error calling method {method}", exc_info=exc
-                )
-                raise exc
-
+        # error responses get logged when they are processed, callers wait on the
+        # future with their own timeout
         future = Future()
-        future.add_done_callback(on_done)
 
         self._calls[msgid] = (method, params, future)
-        self.send_text(json.dumps(payload))
-
-        return future
+        return payload, future
 
     def send_error(self, error: JsonRpcError, msgid: Any = None):
         payload = {
@@ -277,22 +328,29 @@ class JsonRpcClient(websocket.WebSocketApp):
         self.send_text(json.dumps(payload))
 
     def add_subscription(self, notification, callback):
-        if callback not in self._subscribers[notification]:
-            self._subscribers[notification].append(callback)
+        with self._subscribers_lock:
+            subscribers = self._subscribers.get(notification, ())
+            if callback not in subscribers:
+                self._subscribers[notification] = subscribers + (callback,)
 
     def remove_subscription(self, notification, callback):
-        try:
-            self._subscribers[notification].remove(callback)
-        except ValueError:
-            pass
+        with self._subscribers_lock:
+            subscribers = self._subscribers.get(notification, ())
+            if callback not in subscribers:
+                return
+
+            remaining = tuple(sub for sub in subscribers if sub != callback)
+            if remaining:
+                self._subscribers[notification] = remaining
+            else:
+                del self._subscribers[notification]
 
     def reset_subscriptions(self):
-        self._subscribers.clear()
+        with self._subscribers_lock:
+            self._subscribers = {}
 
     def _generate_msgid(self):
-        with self._msgid_lock:
-            self._msgid_counter += 1
-            return self._msgid_counter
+        return next(self._msgid_counter)
 
     def _dual_log(self, level, *args, **kwargs):
         self._logger.log(level, *args, **kwargs)
@@ -0,0 +1,214 @@
+import time
+from concurrent.futures import Future
+from unittest import mock
+
+import pytest
+
+from octoprint_moonraker_connector import client as client_module
+from octoprint_moonraker_connector.client import MoonrakerClient
+
+TIMEOUT = 5.0
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _listing(*filenames: str, dirs: tuple[str, ...] = ()) -> dict:
+    return {
+        "disk_usage": {"free": 100, "used": 50, "total": 150},
+        "files": [
+            {"filename": filename, "modified": 1000.0, "size": 10}
+            for filename in filenames
+        ],
+        "dirs": [{"dirname": d, "modified": 1000.0, "size": 10} for d in dirs],
+    }
+
+
+@pytest.fixture
+def client():
+    client = MoonrakerClient(mock.MagicMock(), "printer", port=7125)
+    client.call_method = mock.Mock()
+    client._schedule_refreshes = mock.Mock()
+
+    client._refresh_tree(
+        path="", request=_done(_listing("a.gcode", "b.gcode", dirs=("sub",)))
+    ).result(timeout=TIMEOUT)
+    client._refresh_tree(path="sub", request=_done(_listing("c.gcode"))).result(
+        timeout=TIMEOUT
+    )
+    return client
+
+
+def _item(path: str) -> dict:
+    return {"root": "gcodes", "path": path, "modified": 2000.0, "size": 0}
+
+
+@pytest.mark.parametrize(
+    "change, expected_files, expected_refreshes, expected_notifications",
+    (
+        (
+            {"action": "delete_file", "item": _item("a.gcode")},
+            {".", "b.gcode", "sub/.", "sub/c.gcode"},
+            [],
+            [""],
+        ),
+        (
+            {"action": "delete_dir", "item": _item("sub")},
+            {".", "a.gcode", "b.gcode"},
+            [],
+            [""],
+        ),
+        (
+            {"action": "create_dir", "item": _item("sub/new")},
+            {".", "a.gcode", "b.gcode", "sub/.", "sub/c.gcode", "sub/new/."},
+            [],
+            ["sub"],
+        ),
+        (
+            {
+                "action": "move_file",
+                "item": _item("sub/a.gcode"),
+                "source_item": _item("a.gcode"),
+            },
+            {".", "b.gcode", "sub/.", "sub/c.gcode"},
+            [("gcodes", "sub", False)],
+            [""],
+        ),
+        (
+            {
+                "action": "move_dir",
+                "item": _item("other"),
+                "source_item": _item("sub"),
+            },
+            {".", "a.gcode", "b.gcode"},
+            [("gcodes", "other", True)],
+            [""],
+        ),
+        (
+            {"action": "create_file", "item": _item("sub/d.gcode")},
+            {".", "a.gcode", "b.gcode", "sub/.", "sub/c.gcode"},
+            [("gcodes", "sub", False)],
+            [],
+        ),
+        (
+            {"action": "delete_file", "item": {"root": "config", "path": "a.cfg"}},
+            {".", "a.gcode", "b.gcode", "sub/.", "sub/c.gcode"},
+            [],
+            [],
+        ),
+    ),
+)
+def test_filelist_changed(
+    client,
+    change: dict,
+    expected_files: set[str],
+    expected_refreshes: list,
+    expected_notifications: list[str],
+):
+    client.on_filelist_changed("notify_filelist_changed", [change])
+
+    assert set(client.current_files) == expected_files
+    assert set(client._file_sources) == {
+        path for path in expected_files if not path.endswith(".")
+    }
+    assert {
+        f.path for subtree in client.current_tree.values() for f in subtree.values()
+    } == expected_files
+
+    if expected_refreshes:
+        client._schedule_refreshes.assert_called_once_with(expected_refreshes)
+    else:
+        client._schedule_refreshes.assert_not_called()
+
+    assert [
+        c.args[1] for c in client._listener.on_moonraker_file_tree_updated.call_args_list
+    ] == expected_notifications
+
+
+def test_stale_refresh_does_not_resurrect_deleted_file(client):
+    request = Future()
+    retried = Future()
+    client.call_method.side_effect = [request, retried]
+
+    result = client._refresh_tree(path="")
+
+    # the file gets deleted while the listing that still contains it is in flight
+    client.on_filelist_changed(
+        "notify_filelist_changed", [{"action": "delete_file", "item": _item("a.gcode")}]
+    )
+    request.set_result(_listing("a.gcode", "b.gcode"))
+
+    assert "a.gcode" not in client.current_files
+    assert not result.done()
+    assert client.call_method.call_count == 2
+
+    retried.set_result(_listing("b.gcode"))
+
+    assert result.result(timeout=TIMEOUT) is client.current_tree
+    assert set(client.current_tree[""]) == {".", "b.gcode"}
+    assert "a.gcode" not in client.current_files
+
+
+@pytest.mark.parametrize(
+    "changed, reused",
+    (
+        ({}, True),
+        ({"size": 20}, False),
+        ({"modified": 2000.0}, False),
+    ),
+)
+def test_unchanged_files_are_reused(client, changed: dict, reused: bool):
+    before = client.current_files["a.gcode"]
+
+    listing = _listing("a.gcode", "b.gcode", dirs=("sub",))
+    listing["files"][0].update(changed)
+    client._refresh_tree(path="", request=_done(listing)).result(timeout=TIMEOUT)
+
+    assert (client.current_files["a.gcode"] is before) == reused
+    assert client.current_files["a.gcode"].size == listing["files"][0]["size"]
+
+
+@pytest.mark.parametrize(
+    "bursts, expected",
+    (
+        (
+            [[("gcodes", "", False)], [("gcodes", "", False)]],
+            {("gcodes", "", False)},
+        ),
+        (
+            [
+                [("gcodes", "sub", False)],
+                [("gcodes", "sub", True)],
+                [("gcodes", "sub", False)],
+            ],
+            {("gcodes", "sub", True)},
+        ),
+        (
+            [[("gcodes", "", False), ("gcodes", "sub", False)]],
+            {("gcodes", "", False), ("gcodes", "sub", False)},
+        ),
+    ),
+)
+def test_refreshes_are_debounced(client, monkeypatch, bursts: list, expected: set):
+    monkeypatch.setattr(client_module, "FILELIST_REFRESH_DELAY", 0.05)
+    del client._schedule_refreshes
+    client.refresh_tree = mock.Mock()
+
+    for refreshes in bursts:
+        client._schedule_refreshes(refreshes)
+    client.refresh_tree.assert_not_called()
+
+    deadline = time.monotonic() + TIMEOUT
+    while client.refresh_tree.call_count < len(expected):
+        assert time.monotonic() < deadline, "no refresh happened"
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    assert client.refresh_tree.call_count == len(expected)
+    assert {
+        (c.kwargs["root"], c.kwargs["path"], c.kwargs["recursive"])
+        for c in client.refresh_tree.call_args_list
+    } == expected
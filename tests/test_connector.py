@@ -0,0 +1,159 @@
+import time
+from typing import Optional
+from unittest import mock
+
+import pytest
+
+import octoprint.filemanager  # noqa: F401 - breaks a circular import in octoprint.printer
+from octoprint.events import Events
+from octoprint.printer.job import PrintJob
+from octoprint_moonraker_connector import connector
+from octoprint_moonraker_connector.client import Coordinate
+from octoprint_moonraker_connector.connector import ConnectedMoonrakerPrinter
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def printer(monkeypatch):
+    monkeypatch.setattr(connector, "Z_CHANGE_INTERVAL", 0.05)
+
+    printer = ConnectedMoonrakerPrinter(None, profile={}, host="printer", port="7125")
+    printer._event_bus = mock.Mock()
+    printer._listener = mock.Mock()
+    yield printer
+    printer.disconnect()
+
+
+def _position(z: float) -> Coordinate:
+    return Coordinate(x=0.0, y=0.0, z=z, e=0.0)
+
+
+def _z_changes(printer) -> list[tuple[float, float]]:
+    return [
+        (c.args[1]["old"], c.args[1]["new"])
+        for c in printer._event_bus.fire.call_args_list
+        if c.args[0] == Events.Z_CHANGE
+    ]
+
+
+def _wait_for_z_changes(printer, count: int) -> list[tuple[float, float]]:
+    deadline = time.monotonic() + TIMEOUT
+    while len(_z_changes(printer)) < count:
+        assert time.monotonic() < deadline, "no z change was reported"
+        time.sleep(0.01)
+    return _z_changes(printer)
+
+
+@pytest.mark.parametrize(
+    "positions, immediate, eventually",
+    (
+        # first change goes out right away, even a tiny one
+        ((0.2, 0.21), [(0.2, 0.21)], [(0.2, 0.21)]),
+        # further changes within the interval get collapsed into one trailing event
+        (
+            (0.2, 0.4, 0.6, 0.8),
+            [(0.2, 0.4)],
+            [(0.2, 0.4), (0.4, 0.8)],
+        ),
+        # a z-hop that returns to the reported height within the interval
+        ((0.2, 0.6, 0.2), [(0.2, 0.6)], [(0.2, 0.6), (0.6, 0.2)]),
+        # no z movement at all
+        ((0.2, 0.2), [], []),
+    ),
+)
+def test_z_change(printer, positions, immediate, eventually):
+    for z in positions:
+        printer.on_moonraker_position_update(_position(z))
+
+    assert _z_changes(printer) == immediate
+    assert _wait_for_z_changes(printer, len(eventually)) == eventually
+
+    time.sleep(0.1)
+    assert _z_changes(printer) == eventually
+
+
+@pytest.mark.parametrize(
+    "updates, expected_calls",
+    (
+        # the file position isn't displayed
+        ([{"file_position": pos} for pos in range(0, 1000, 25)], 1),
+        # elapsed is displayed in whole seconds
+        ([{"print_duration": i * 0.25} for i in range(8)], 2),
+        # progress is displayed with a single decimal in percent
+        (
+            [{"progress": p} for p in (0.1, 0.1002, 0.1004, 0.1006, 0.1008, 0.1012)],
+            2,
+        ),
+        # a typical status update stream, print_stats and virtual_sdcard in turns:
+        # 80 updates, 10 new seconds and 5 new progress steps
+        (
+            [
+                kwargs
+                for i in range(40)
+                for kwargs in (
+                    {"print_duration": 10.0 + i * 0.25},
+                    {"progress": 0.5 + i * 0.0001, "file_position": 5000 + i * 30},
+                )
+            ],
+            15,
+        ),
+    ),
+)
+def test_job_progress_notifications(printer, updates: list[dict], expected_calls: int):
+    printer.set_job(PrintJob(storage="printer", path="test.gcode", display="test.gcode"))
+
+    for kwargs in updates:
+        printer.on_moonraker_print_progress(**kwargs)
+
+    assert printer._listener.on_printer_job_progress.call_count == expected_calls
+
+
+@pytest.mark.parametrize(
+    "tool, expected",
+    (
+        ("tool0", "T0"),
+        ("tool1", "T1"),
+        ("tool", None),
+        ("tool1a", None),
+        ("bed", None),
+    ),
+)
+def test_change_tool(printer, tool: str, expected: Optional[str]):
+    printer._client = mock.Mock()
+
+    if expected is None:
+        with pytest.raises(ValueError):
+            printer.change_tool(tool)
+        printer._client.send_gcode_commands.assert_not_called()
+    else:
+        printer.change_tool(tool)
+        printer._client.send_gcode_commands.assert_called_once_with(expected)
+
+
+@pytest.mark.parametrize(
+    "heater, separate_nozzles, expected",
+    (
+        ("tool", True, "M104 S200"),
+        ("tool1", True, "M104 T1 S200"),
+        ("tool1", False, "M104 S200"),
+        ("bed", True, "M140 S200"),
+        ("chamber", True, "M141 S200"),
+        ("toolx", True, ValueError),
+        ("cooler", True, None),
+    ),
+)
+def test_set_temperature(printer, heater: str, separate_nozzles: bool, expected):
+    printer._client = mock.Mock()
+    printer._separate_nozzles = separate_nozzles
+
+    if expected is ValueError:
+        with pytest.raises(ValueError):
+            printer.set_temperature(heater, 200)
+    else:
+        printer.set_temperature(heater, 200)
+
+    if isinstance(expected, str):
+        printer._client.send_gcode_commands.assert_called_once_with(expected)
+    else:
+        printer._client.send_gcode_commands.assert_not_called()
@@ -0,0 +1,178 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from octoprint_moonraker_connector.jsonrpc import (
+    JsonRpcClient,
+    JsonRpcError,
+    JsonRpcMethodNotFoundError,
+)
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def client():
+    client = JsonRpcClient("ws://printer/websocket")
+    client._dispatch_executor = ThreadPoolExecutor(max_workers=1)
+    client._response_executor = ThreadPoolExecutor(max_workers=3)
+    client.sent = []
+    client.send_text = lambda text: client.sent.append(json.loads(text))
+    client.close = mock.Mock()
+    yield client
+    if client._dispatch_executor is not None:
+        client._dispatch_executor.shutdown()
+        client._response_executor.shutdown()
+
+
+def _notification(method: str, *params) -> dict:
+    return {"jsonrpc": "2.0", "method": method, "params": list(params)}
+
+
+def _result(msgid: int, result) -> dict:
+    return {"jsonrpc": "2.0", "id": msgid, "result": result}
+
+
+def _wait_for_call(client: JsonRpcClient) -> dict:
+    deadline = time.monotonic() + TIMEOUT
+    while not client.sent:
+        assert time.monotonic() < deadline, "no call was sent"
+        time.sleep(0.01)
+    return client.sent[0]
+
+
+def _drain(client: JsonRpcClient) -> None:
+    # notifications are handled on a single worker, so this runs after all of them
+    client._dispatch_executor.submit(lambda: None).result(timeout=TIMEOUT)
+
+
+@pytest.mark.parametrize("batched", (False, True))
+def test_notifications_are_handled_in_order(client, batched: bool):
+    received = []
+    client.add_subscription("notify_a", lambda method, params: received.append(params))
+    client.add_subscription("notify_b", lambda method, params: received.append(params))
+
+    frames = [_notification("notify_a" if i % 2 else "notify_b", i) for i in range(50)]
+    if batched:
+        client.on_message(None, json.dumps(frames))
+    else:
+        for frame in frames:
+            client.on_message(None, json.dumps(frame))
+
+    _drain(client)
+    assert received == [[i] for i in range(50)]
+
+
+@pytest.mark.parametrize("batched", (False, True))
+def test_notification_handler_can_wait_on_call(client, batched: bool):
+    results = []
+
+    def handler(method, params):
+        future = client.call_method("printer.print.start")
+        results.append(future.result(timeout=TIMEOUT))
+
+    client.add_subscription("notify_action", handler)
+    client.on_message(None, json.dumps(_notification("notify_action")))
+
+    # the handler is now blocked on its call, answer it together with a later
+    # notification that has to wait for the handler
+    later = []
+    client.add_subscription("notify_later", lambda method, params: later.append(params))
+
+    call = _wait_for_call(client)
+
+    frames = [_result(call["id"], "ok"), _notification("notify_later", 1)]
+    if batched:
+        client.on_message(None, json.dumps(frames))
+    else:
+        for frame in frames:
+            client.on_message(None, json.dumps(frame))
+
+    _drain(client)
+    assert results == ["ok"]
+    assert later == [[1]]
+
+
+@pytest.mark.parametrize(
+    "response, expected, error",
+    (
+        ({"result": {"state": "ready"}}, {"state": "ready"}, None),
+        (
+            {"error": {"code": -32601, "message": "Method not found"}},
+            None,
+            JsonRpcMethodNotFoundError,
+        ),
+        ({"error": {"code": 400, "message": "Bad request"}}, None, JsonRpcError),
+    ),
+)
+def test_call_method_resolves_future(client, response: dict, expected, error):
+    future = client.call_method("server.info")
+    msgid = client.sent[0]["id"]
+
+    client.on_message(None, json.dumps({"jsonrpc": "2.0", "id": msgid, **response}))
+
+    if error is None:
+        assert future.result(timeout=TIMEOUT) == expected
+    else:
+        with pytest.raises(error):
+            future.result(timeout=TIMEOUT)
+    assert msgid not in client._calls
+
+
+@pytest.mark.parametrize(
+    "frame",
+    (
+        _notification("notify_status_update", {"extruder": {}}),
+        _result(1, "ok"),
+        [_notification("notify_status_update", {}), _result(1, "ok")],
+    ),
+)
+def test_frames_after_disconnect_are_dropped(client, frame):
+    received = []
+    client.add_subscription(
+        "notify_status_update", lambda method, params: received.append(params)
+    )
+    future = client.call_method("server.info")
+
+    client.disconnect()
+    client.on_message(None, json.dumps(frame))
+
+    assert received == []
+    assert not future.done()
+
+
+@pytest.mark.parametrize(
+    "calls",
+    (
+        [("server.info", None)],
+        [
+            ("server.files.get_directory", {"path": "gcodes/a"}),
+            ("server.files.get_directory", {"path": "gcodes/b"}),
+            ("printer.info", None),
+        ],
+    ),
+)
+def test_call_batch(client, calls: list[tuple]):
+    futures = client.call_batch(calls)
+
+    # all calls go out as a single frame
+    assert len(client.sent) == 1
+    batch = client.sent[0]
+    assert [(call["method"], call.get("params")) for call in batch] == calls
+
+    ids = [call["id"] for call in batch]
+    assert len(set(ids)) == len(ids)
+
+    # answered in a different order, every future still gets its own result
+    client.on_message(
+        None, json.dumps([_result(msgid, msgid) for msgid in reversed(ids)])
+    )
+    assert [future.result(timeout=TIMEOUT) for future in futures] == ids
+
+
+def test_call_batch_empty(client):
+    assert client.call_batch([]) == []
+    assert client.sent == []
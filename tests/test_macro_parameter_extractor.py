@@ -19,6 +19,10 @@ from octoprint_moonraker_connector.client import extract_macro_parameters
             "test params.FOO|lower bar params.FNORD|default(0)",
             {"FOO": None, "FNORD": "0"},
         ),
+        (
+            "test params.FOO|default(-1.5) params.BAR|default( 'x') params.BAZ",
+            {"FOO": "-1.5", "BAR": "x", "BAZ": None},
+        ),
     ),
 )
 def test_extract_macro_parameters(gcode: str, expected: dict[str, Any]):
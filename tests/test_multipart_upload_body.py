@@ -0,0 +1,79 @@
+import io
+from unittest import mock
+
+import pytest
+import requests
+from urllib3.fields import RequestField
+from urllib3.filepost import encode_multipart_formdata
+
+from octoprint_moonraker_connector.client import MultipartUploadBody
+
+BOUNDARY = "0123456789abcdef"
+
+
+def _expected(fields: dict[str, str], filename: str, content: bytes) -> bytes:
+    file_field = RequestField(name="file", data=content, filename=filename)
+    file_field.make_multipart(content_type="application/octet-stream")
+    body, _ = encode_multipart_formdata(
+        list(fields.items()) + [file_field], boundary=BOUNDARY
+    )
+    return body
+
+
+def _body(fields: dict[str, str], filename: str, content: bytes) -> MultipartUploadBody:
+    with mock.patch(
+        "octoprint_moonraker_connector.client.choose_boundary", return_value=BOUNDARY
+    ):
+        return MultipartUploadBody(
+            fields, "file", filename, io.BytesIO(content), len(content)
+        )
+
+
+@pytest.mark.parametrize(
+    "fields, filename, content",
+    (
+        ({"root": "gcodes", "path": ""}, "test.gcode", b"G28\nG1 X10\n"),
+        ({"root": "gcodes", "path": "sub/folder"}, "test.gcode", b""),
+        ({"root": "gcodes", "path": "Ordner ä"}, "Bénchy ✓.gcode", b"G28\n" * 1000),
+    ),
+)
+@pytest.mark.parametrize("chunk_size", (-1, None, 1, 7, 4096))
+def test_multipart_upload_body(
+    fields: dict[str, str], filename: str, content: bytes, chunk_size
+):
+    body = _body(fields, filename, content)
+    expected = _expected(fields, filename, content)
+
+    if chunk_size is None or chunk_size < 0:
+        actual = body.read(chunk_size)
+    else:
+        actual = b""
+        while chunk := body.read(chunk_size):
+            assert len(chunk) <= chunk_size
+            actual += chunk
+
+    assert actual == expected
+    assert body.len == len(expected)
+    assert body.content_type == f"multipart/form-data; boundary={BOUNDARY}"
+    assert body.read() == b""
+
+
+@pytest.mark.parametrize(
+    "filename, content",
+    (
+        ("test.gcode", b"G28\n"),
+        ("Bénchy ✓.gcode", b"G28\n" * 1000),
+    ),
+)
+def test_multipart_upload_body_content_length(filename: str, content: bytes):
+    body = _body({"root": "gcodes", "path": ""}, filename, content)
+
+    request = requests.Request(
+        "POST",
+        "http://printer/server/files/upload",
+        headers={"Content-Type": body.content_type},
+        data=body,
+    ).prepare()
+
+    assert request.headers["Content-Length"] == str(body.len)
+    assert body.len == len(_expected({"root": "gcodes", "path": ""}, filename, content))
@@ -0,0 +1,96 @@
+from typing import Optional
+from unittest import mock
+
+import pytest
+
+from octoprint_moonraker_connector.client import MoonrakerClient
+
+
+@pytest.fixture
+def client():
+    return MoonrakerClient(mock.MagicMock(), "printer", port=7125)
+
+
+def _update(print_stats: Optional[dict] = None, virtual_sdcard: Optional[dict] = None):
+    payload = {}
+    if print_stats is not None:
+        payload["print_stats"] = print_stats
+    if virtual_sdcard is not None:
+        payload["virtual_sdcard"] = virtual_sdcard
+    return payload
+
+
+@pytest.mark.parametrize(
+    "updates, expected",
+    (
+        # nothing known yet
+        ([], None),
+        # no file size yet
+        ([_update({"state": "printing", "filename": "a.gcode"})], None),
+        # fields get merged across updates
+        (
+            [
+                _update({"state": "printing", "filename": "a.gcode"}),
+                _update(virtual_sdcard={"file_size": 1000, "file_position": 10}),
+                _update(virtual_sdcard={"file_position": 20}),
+            ],
+            ("a.gcode", 20),
+        ),
+        # a paused job resuming keeps what we know
+        (
+            [
+                _update(
+                    {"state": "printing", "filename": "a.gcode"}, {"file_size": 1000}
+                ),
+                _update({"state": "paused"}),
+                _update({"state": "printing"}, {"file_position": 30}),
+            ],
+            ("a.gcode", 30),
+        ),
+        # a new job starting drops the previous one's data
+        (
+            [
+                _update(
+                    {"state": "printing", "filename": "a.gcode"}, {"file_size": 1000}
+                ),
+                _update({"state": "complete"}),
+                _update({"state": "printing", "filename": "b.gcode"}),
+            ],
+            None,
+        ),
+    ),
+)
+def test_cached_print_status(client, updates: list[dict], expected):
+    for payload in updates:
+        client._process_update(payload)
+
+    cached = client.cached_print_status()
+    if expected is None:
+        assert cached is None
+    else:
+        print_stats, virtual_sdcard = cached
+        assert (print_stats.filename, virtual_sdcard.file_position) == expected
+
+
+@pytest.mark.parametrize(
+    "change",
+    (
+        lambda client: client._process_update(
+            _update({"filename": "b.gcode"}, {"file_position": 50})
+        ),
+        lambda client: client._reset_print_status(),
+    ),
+)
+def test_print_status_snapshot_is_never_mutated(client, change):
+    client._process_update(
+        _update({"state": "printing", "filename": "a.gcode"}, {"file_size": 1000})
+    )
+    snapshot = client._print_status
+
+    change(client)
+
+    assert snapshot == {
+        "print_stats": {"state": "printing", "filename": "a.gcode"},
+        "virtual_sdcard": {"file_size": 1000},
+    }
+    assert client._print_status is not snapshot
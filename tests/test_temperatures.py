@@ -0,0 +1,70 @@
+import time
+from unittest import mock
+
+import pytest
+
+from octoprint_moonraker_connector import client as client_module
+from octoprint_moonraker_connector.client import MoonrakerClient
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(client_module, "TEMPERATURE_INTERVAL", 0.05)
+
+    client = MoonrakerClient(mock.MagicMock(), "printer", port=7125)
+    client._heaters = {"extruder": "tool0", "heater_bed": "bed"}
+    return client
+
+
+def _sent(client) -> list[dict[str, tuple]]:
+    return [
+        {name: tuple(data) for name, data in c.args[0].items()}
+        for c in client._listener.on_moonraker_temperature_update.call_args_list
+    ]
+
+
+@pytest.mark.parametrize(
+    "updates, immediate, eventually",
+    (
+        # actual temperatures are throttled, the latest one goes out at the end
+        (
+            [
+                {"extruder": {"temperature": 20.0}},
+                {"extruder": {"temperature": 21.0}},
+                {"extruder": {"temperature": 22.0}},
+            ],
+            [{"tool0": (20.0, 0.0)}],
+            [{"tool0": (20.0, 0.0)}, {"tool0": (22.0, 0.0)}],
+        ),
+        # target changes always go out right away
+        (
+            [
+                {"extruder": {"temperature": 20.0}},
+                {"extruder": {"target": 200.0}},
+            ],
+            [{"tool0": (20.0, 0.0)}, {"tool0": (20.0, 200.0)}],
+            [{"tool0": (20.0, 0.0)}, {"tool0": (20.0, 200.0)}],
+        ),
+        # updates without any heater don't count
+        (
+            [{"print_stats": {"state": "printing"}}],
+            [],
+            [],
+        ),
+    ),
+)
+def test_temperature_updates(client, updates: list[dict], immediate, eventually):
+    for payload in updates:
+        client._update_temperatures(payload)
+
+    assert _sent(client) == immediate
+
+    deadline = time.monotonic() + TIMEOUT
+    while len(_sent(client)) < len(eventually):
+        assert time.monotonic() < deadline, "no temperature update was sent"
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    assert _sent(client) == eventually
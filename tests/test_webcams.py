@@ -0,0 +1,85 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+
+from octoprint_moonraker_connector import MoonrakerConnectorPlugin
+
+
+@pytest.fixture
+def plugin():
+    plugin = MoonrakerConnectorPlugin()
+    plugin._logger = logging.getLogger("test")
+    plugin._webcam_executor = ThreadPoolExecutor(max_workers=2)
+    plugin._webcam_cache = None
+    yield plugin
+    plugin._webcam_executor.shutdown()
+
+
+@pytest.mark.parametrize(
+    "moonraker_fails, fluidd_fails, expected_calls",
+    (
+        (False, False, 1),
+        (True, False, 2),
+        (False, True, 2),
+        (True, True, 2),
+    ),
+)
+def test_get_all_webcams_caching(
+    plugin, moonraker_fails: bool, fluidd_fails: bool, expected_calls: int
+):
+    def fetcher(fails):
+        if fails:
+            return mock.Mock(side_effect=OSError("unreachable"))
+        return mock.Mock(return_value=[])
+
+    plugin._get_moonraker_webcams = fetcher(moonraker_fails)
+    plugin._get_legacy_fluidd_webcams = fetcher(fluidd_fails)
+
+    plugin._get_all_webcams("printer", 7125)
+    plugin._get_all_webcams("printer", 7125)
+
+    assert plugin._get_moonraker_webcams.call_count == expected_calls
+    assert plugin._get_legacy_fluidd_webcams.call_count == expected_calls
+
+
+def _response(status_code: int, content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    return response
+
+
+@pytest.mark.parametrize(
+    "status_code, content, expected",
+    (
+        (200, b'{"result": {"webcams": []}}', {"result": {"webcams": []}}),
+        (200, b"", {}),
+        (404, b'{"error": {"code": 404, "message": "Namespace not found"}}', {}),
+    ),
+)
+def test_query_moonraker(plugin, status_code: int, content: bytes, expected: dict):
+    plugin._session = mock.Mock()
+    plugin._session.request.return_value = _response(status_code, content)
+
+    actual = plugin._query_moonraker("get", "http://{host}:{port}/", "printer", 7125)
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "status_code, content",
+    (
+        (401, b'{"error": {"code": 401, "message": "Unauthorized"}}'),
+        (500, b'{"error": {"code": 500, "message": "Internal Server Error"}}'),
+        (502, b""),
+        (304, b""),
+    ),
+)
+def test_query_moonraker_error(plugin, status_code: int, content: bytes):
+    plugin._session = mock.Mock()
+    plugin._session.request.return_value = _response(status_code, content)
+
+    with pytest.raises(requests.HTTPError):
+        plugin._query_moonraker("get", "http://{host}:{port}/", "printer", 7125)